@@ -1,7 +1,12 @@
 #!usr/bin/python3
+import collections
 import math
 import numpy as np
 import scipy.io as scio
+from scipy.spatial import cKDTree
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+from point_store import PointSet
 import matplotlib.pyplot as plt
 import matplotlib.cm as cmx
 import matplotlib.colors as colors
@@ -9,6 +14,9 @@ from sklearn.cluster import DBSCAN ##INCLUDED TO COMPARE WITH SKLEARN RESULT - N
 
 FILENAME = "DBSCAN-Points.mat"
 OUTDIR = "dbscan_outs/" #directory in which output files will be stored
+MINPTS_PARAMS = [i for i in range(2, 6)] #possible minpts = 2...6 in the parameter sweep
+DIST_PARAMS = [i/100 for i in range(8, 24, 4)] #possible eps = 0.08 ... 0.24 in the parameter sweep
+SILHOUETTE_BLOCK_BYTES = 64 * 1024 * 1024 #bytes of pairwise distances held at once while computing silouette coefficients
 
 def doSKLearn(dataset, epsilon, minpoints):
     '''
@@ -33,148 +41,461 @@ def doSKLearn(dataset, epsilon, minpoints):
     #plt.show() #show plot
    
 
-class Point: 
+class BruteForceIndex:
     '''
-    Helper point class 
-    Each member in dataset needs to be a point before it can be processed by DBScan class
-    Following labels possible:
-        -2 - Undefined 
-        -1 - Outlier
-        1 ... n - belongs to cluster 1...n
+    Reference neighbor search backend - computes the distance from p to every point for every query 
+    Every backend takes a PointSet and returns the indices of the points within epsilon of point p (p included), ascending 
+    '''
+    def __init__(self, points, epsilon):
+        self.points = points
+        self.epsilon = epsilon
+    def query(self, p): #returns indices of points within euclidian distance epsilon of point p
+        return np.nonzero(self.points.distancesFrom(p) <= self.epsilon)[0]
+
+class GridIndex:
+    '''
+    Neighbor search backend using a uniform grid of epsilon sized cells, hashed by integer cell coordinates 
+    Points within epsilon of p are at most one cell away in every dimension, so a query only checks the 3^d cells around p 
+    '''
+    def __init__(self, points, epsilon):
+        self.points = points
+        self.epsilon = epsilon
+        self.cellSize = epsilon * (1 + 1e-9) #slightly larger than epsilon so float rounding can't push a neighbor 2 cells away
+        self.cellOf = np.floor(points.coords / self.cellSize).astype(np.int64) #integer cell coordinates of every point
+        self.cells = {} #cell coordinates -> indices of points in that cell, ascending
+        order = np.lexsort(self.cellOf.T[::-1]) #points grouped by cell, in dataset order within a cell
+        sortedCells = self.cellOf[order]
+        bounds = np.flatnonzero(np.any(sortedCells[1:] != sortedCells[:-1], axis=1)) + 1
+        for group in np.split(order, bounds) if len(order) > 0 else []:
+            self.cells[tuple(self.cellOf[group[0]].tolist())] = group
+        self.offsets = [np.asarray(o) for o in np.ndindex(*([3] * points.getDim()))] #offsets (in 0..2) of the neighboring cells
+    def query(self, p): #returns indices of points within euclidian distance epsilon of point p
+        base = self.cellOf[p] - 1
+        candidates = [self.cells.get(tuple((base + o).tolist())) for o in self.offsets]
+        candidates = np.sort(np.concatenate([c for c in candidates if c is not None])) #back to dataset order
+        return candidates[self.points.distancesFrom(p, candidates) <= self.epsilon]
+
+class KDTreeIndex:
     '''
-    def __init__(self, x, y): #initialize point with given coordinates and undefined label
-        self.x = x
-        self.y = y
-        self.label = -2 #undefined label
-    def distanceWith(self, p2): #compute euclidian distance with another point 
-        return math.sqrt(math.pow((p2.x - self.x), 2) + math.pow((p2.y - self.y), 2))
-    def equals(self, p2):
-        return self.x == p2.x and self.y == p2.y
-    def resetLabel(self): #reset label to undefined
-        self.label = -2
-    def __str__(self): #for pretty printing 
-        return str(self.x) + ", " + str(self.y)
+    Neighbor search backend using scipy's KD-tree 
+    The tree radius is padded a little and candidates are re-checked with PointSet.distancesFrom, so points 
+    exactly at distance epsilon are treated the same as by the other backends 
+    '''
+    def __init__(self, points, epsilon):
+        self.points = points
+        self.epsilon = epsilon
+        self.tree = cKDTree(points.coords)
+    def query(self, p): #returns indices of points within euclidian distance epsilon of point p
+        candidates = np.sort(np.asarray(self.tree.query_ball_point(self.points.coords[p], self.epsilon * (1 + 1e-9) + 1e-12), dtype=np.int64))
+        return candidates[self.points.distancesFrom(p, candidates) <= self.epsilon]
+
+BACKENDS = {"brute": BruteForceIndex, "grid": GridIndex, "kdtree": KDTreeIndex} #neighbor search backends for DBScan
 
 class DBScan:
     '''
     DBScan class 
     class based implementation for DBScan algo 
+    points is a PointSet (any number of dimensions), the clustering is written to points.labels:
+        -2 - Undefined 
+        -1 - Outlier
+        1 ... n - belongs to cluster 1...n
+    backend picks the neighbor search used by rangeQuery (see BACKENDS), all of them give the same labels 
     '''
-    def __init__(self, dataset, epsilon, minpoints): #initialize model with dataset and parameters 
-        self.dataset = dataset # assume dataset is a list of points 
+    def __init__(self, points, epsilon, minpoints, backend = "grid"): #initialize model with dataset and parameters 
+        self.points = points
         self.resetDataset() #clear previous labels 
         self.epsilon = epsilon
         self.minpoints = minpoints
         self.clusters = 0
-    def rangeQuery(self, p): #returns list of points that are close to given point p (within euclidian distance of self.epsilon)
-        neighbors = []
-        for p2 in self.dataset:
-            if(p.distanceWith(p2) <= self.epsilon):
-                neighbors.append(p2)
-        return neighbors
+        self.index = BACKENDS[backend](points, epsilon) #neighbor search structure, built once
+    def rangeQuery(self, p): #returns indices of points that are close to point p (within euclidian distance of self.epsilon)
+        return self.index.query(p)
     def runScan(self): #run DBScan algorithm on dataset
-        for p in self.dataset: # for every point 
-            if p.label != -2:  # if label is defined then skip it (as it has been processed in one of the previous iterations)
+        labels = self.points.labels.tolist() #plain list while scanning, element access on it is much cheaper than on the array
+        for p in range(len(labels)): # for every point 
+            if labels[p] != -2:  # if label is defined then skip it (as it has been processed in one of the previous iterations)
                 continue
             neighbors = self.rangeQuery(p) # get neighbors of point 
             if(len(neighbors) < self.minpoints): # if number of neighbors less than threshold then point is not a core point
-                p.label = -1
+                labels[p] = -1
                 continue # skip that point as it will be assigned a cluster in one of the next iterations if it is a border point 
             self.clusters += 1 # add a cluster
-            p.label = self.clusters # assign current point to that cluster 
-            seedset = [n for n in neighbors if not(p.equals(n))] # seedset is points that are neighbors of p but not p 
+            labels[p] = self.clusters # assign current point to that cluster 
+            seedset = [n for n in neighbors.tolist() if n != p] # seedset is points that are neighbors of p but not p itself (duplicates of p are kept)
+            queued = set(seedset) # points currently in the seedset, so membership checks don't rescan it 
             while(len(seedset) > 0): #While seedset is not empty
                 n = seedset.pop() #get point from seedset 
-                if(n.label == -1): #if that point has outlier label then assign it to current cluster 
-                    n.label = self.clusters
-                if(n.label != -2): #if that point's label is not undefined then skip it (as it has already been processed)
+                queued.discard(n)
+                if(labels[n] == -1): #if that point has outlier label then assign it to current cluster 
+                    labels[n] = self.clusters
+                if(labels[n] != -2): #if that point's label is not undefined then skip it (as it has already been processed)
                     continue
-                n.label = self.clusters #assign current point to the cluster 
+                labels[n] = self.clusters #assign current point to the cluster 
                 ns2 = self.rangeQuery(n) #get all points in the neighborhood of the current point 
                 #to take care of candidate core points around current core point 
                 if(len(ns2) >= self.minpoints): # if number of points in neighborhood is greater than the threshold then  
-                    tmp = list(set(ns2) - set(seedset)) # get those points that are in this neighborhood but not in the current seedset 
-                    for t in tmp:
-                        seedset.append(t) #add them to the seedset 
+                    for t in ns2.tolist(): # get those points that are in this neighborhood but not in the current seedset 
+                        if t not in queued:
+                            seedset.append(t) #add them to the seedset 
+                            queued.add(t)
+        self.points.labels[:] = labels
     def getCmap(self): #Helper function to map a color to each cluster (for visualization )
-        N = self.clusters
-        color_norm  = colors.Normalize(vmin=0, vmax=N)
-        scalar_map = cmx.ScalarMappable(norm=color_norm, cmap='nipy_spectral') 
-        def map_index_to_rgb_color(index):
-            return scalar_map.to_rgba(index)
-        return map_index_to_rgb_color
-    def showResult(self, title = None): #plot clustered dataset 
-        if(title is None):
-            title = "DBSCAN RESULT"
-        plt.title(title) #give plot title 
-        cmap = self.getCmap() #get a mapping from cluster number to label
-        for p in self.dataset:
-            plt.scatter([p.x], [p.y], color=cmap(p.label), marker="x" if p.label == -1 else "o") #for each point plot it on graph with designated cluster's color
-        plt.savefig(OUTDIR + title+".png", bbox_inches="tight")
-        plt.clf()
-        #plt.show()
+        return getCmap(self.clusters)
+    def showResult(self, title = None): #plot clustered dataset (first two dimensions)
+        showClusters(self.points, self.clusters, title)
     def getSilouetteCoeff(self): # method to compute average silouette coefficient over the entire dataset - intrinsic performance indicator 
-        if(self.clusters == 0): # if no clusters created then 0 score 
-            return 0
-        cof_sum = 0
-        for p in self.dataset: #for every point in dataset
-            ai_sum = 0 # maintain sum for a(i) - average distance of point with other points in cluster 
-            ai_c = 0 #maintain count for ai - how many points in cluster 
-            if(p.label == -1): # if point is outlier then skip it 
+        return getSilouetteCoeff(self.points, self.clusters)
+    def getSilouetteEstimate(self, sampleSize, seed = 0): #sampled estimate of the coefficient and its standard error, for large datasets
+        return getSilouetteEstimate(self.points, self.clusters, sampleSize, seed)
+    def resetDataset(self): #method to reset all labels in given dataset
+        self.points.resetLabels()
+
+
+class DBScanSweep:
+    '''
+    Runs DBScan for every (epsilon, minpoints) pair of a parameter grid from one neighbor computation 
+    All pairs of points within the largest epsilon are found once and kept sorted by distance, so the pairs 
+    within any smaller epsilon are a prefix of them. For a given (epsilon, minpoints): 
+        core points - points with at least minpoints neighbors (themselves included) 
+        clusters - connected components of core points within epsilon of each other, numbered by their first core point 
+        border points - non core points within epsilon of a core point, they join the lowest numbered such cluster 
+    which are exactly the labels DBScan.runScan gives, without a single range query 
+    '''
+    def __init__(self, points, epsilons, minpointsList):
+        self.points = points
+        self.epsilons = sorted(epsilons)
+        self.minpointsList = sorted(minpointsList)
+        coords = points.coords
+        maxEps = self.epsilons[-1]
+        pairs = cKDTree(coords).query_pairs(maxEps * (1 + 1e-9) + 1e-12, output_type="ndarray") #padded like KDTreeIndex
+        dists = np.sqrt(((coords[pairs[:, 1]] - coords[pairs[:, 0]]) ** 2).sum(axis=1)) #same distances as PointSet.distancesFrom
+        order = np.argsort(dists, kind="stable")
+        order = order[dists[order] <= maxEps]
+        self.pairs = pairs[order] #(i, j) pairs within the largest epsilon, closest first
+        self.dists = dists[order]
+    def getLabels(self, epsilon, minpoints): #labels (as in PointSet.labels) and number of clusters DBScan finds for the pair
+        if epsilon > self.epsilons[-1]:
+            raise ValueError("epsilon " + str(epsilon) + " is larger than the largest epsilon of the sweep")
+        n = len(self.points)
+        pairs = self.pairs[:np.searchsorted(self.dists, epsilon, side="right")] #all pairs within epsilon
+        counts = 1 + np.bincount(pairs.ravel(), minlength=n) #neighborhood sizes, point itself included
+        core = counts >= minpoints
+        labels = np.full(n, -1, dtype=np.int64) #everything is an outlier unless it is reached below
+        coreIdx = np.nonzero(core)[0]
+        if len(coreIdx) == 0:
+            return labels, 0
+        coreCore = pairs[core[pairs[:, 0]] & core[pairs[:, 1]]]
+        graph = coo_matrix((np.ones(len(coreCore), dtype=np.int8), (coreCore[:, 0], coreCore[:, 1])), shape=(n, n))
+        ncomp, comp = connected_components(graph, directed=False)
+        comps = comp[coreIdx]
+        found, first = np.unique(comps, return_index=True) #first core point (lowest index) of every cluster
+        clusterOf = np.zeros(ncomp, dtype=np.int64)
+        clusterOf[found[np.argsort(first)]] = np.arange(1, len(found) + 1) #clusters numbered in the order runScan starts them
+        labels[coreIdx] = clusterOf[comps]
+        border = pairs[core[pairs[:, 0]] != core[pairs[:, 1]]] #pairs of one core and one non core point
+        borderPt = np.where(core[border[:, 0]], border[:, 1], border[:, 0])
+        corePt = np.where(core[border[:, 0]], border[:, 0], border[:, 1])
+        best = np.full(n, len(found) + 1, dtype=np.int64)
+        np.minimum.at(best, borderPt, labels[corePt])
+        reached = ~core & (best <= len(found))
+        labels[reached] = best[reached]
+        return labels, len(found)
+    def apply(self, epsilon, minpoints): #write the pair's clustering to points.labels, returns the number of clusters
+        labels, clusters = self.getLabels(epsilon, minpoints)
+        self.points.labels[:] = labels
+        return clusters
+    def runSweep(self, quality = True): #(minpoints, epsilon) -> (clusters, silouette coefficient or None) for the whole grid
+        res = {}
+        for pts in self.minpointsList:
+            for eps in self.epsilons:
+                clusters = self.apply(eps, pts)
+                res[(pts, eps)] = (clusters, getSilouetteCoeff(self.points, clusters) if quality else None)
+        return res
+
+class IncrementalDBScan:
+    '''
+    DBScan over points that are inserted and deleted a few at a time, without clustering everything again
+    Keeps a grid of epsilon sized cells (as GridIndex), the neighbor count of every point and the cluster of
+    every core point. Only the neighborhood of an inserted or deleted point is touched:
+        insert - neighbor counts go up, points reaching minpoints become core and join (merging) the clusters
+                 of their core neighbors, the smaller clusters are the ones relabelled
+        delete - neighbor counts go down, and if core points were lost their cluster may split. A search is
+                 grown from each remaining core neighbor of the lost points, one point per search in turn, and
+                 searches that meet are merged - it stops as soon as at most one search is still growing, so
+                 only the parts that split off (usually small) are walked and relabelled
+    Border points are resolved when labels are read, the same way runScan does it
+    Points get increasing ids in insertion order, getLabels gives the labels DBScan.runScan gives on the
+    points still present, in id order
+    '''
+    def __init__(self, epsilon, minpoints):
+        self.epsilon = epsilon
+        self.minpoints = minpoints
+        self.cellSize = epsilon * (1 + 1e-9) #slightly larger than epsilon so float rounding can't push a neighbor 2 cells away
+        self.coords = None #coordinates of every point ever inserted, row = id (grown by doubling)
+        self.size = 0 #number of ids given out
+        self.cellOf = [] #id -> cell coordinates
+        self.cells = {} #cell coordinates -> ids of present points in that cell
+        self.counts = [] #id -> number of present points within epsilon (itself included), 0 once deleted
+        self.clusterOf = {} #core id -> cluster id
+        self.members = {} #cluster id -> set of its core ids
+        self.nextCluster = 0 #next unused cluster id
+        self.offsets = None #offsets of the neighboring cells
+        self.clusters = 0 #number of clusters found by the last getLabels
+    def isCore(self, i):
+        return self.counts[i] >= self.minpoints
+    def neighbors(self, i): #ids of present points within euclidian distance epsilon of point i (i included)
+        base = self.cellOf[i]
+        candidates = []
+        for o in self.offsets:
+            candidates.extend(self.cells.get(tuple(b + d for b, d in zip(base, o)), ()))
+        candidates = np.asarray(candidates, dtype=np.int64)
+        dists = np.sqrt(((self.coords[candidates] - self.coords[i]) ** 2).sum(axis=1)) #same distances as PointSet.distancesFrom
+        return candidates[dists <= self.epsilon].tolist()
+    def makeCore(self, i, neighbors): #point i became core - it joins the clusters of its core neighbors, merging them
+        near = set(self.clusterOf[n] for n in neighbors if n in self.clusterOf)
+        if len(near) == 0:
+            cid = self.nextCluster
+            self.nextCluster += 1
+            self.members[cid] = set()
+        else:
+            cid = max(near, key=lambda c: len(self.members[c])) #the largest cluster keeps its id
+            for other in near:
+                if other != cid:
+                    for c in self.members[other]:
+                        self.clusterOf[c] = cid
+                    self.members[cid] |= self.members.pop(other)
+        self.clusterOf[i] = cid
+        self.members[cid].add(i)
+    def insert(self, points): #insert points (rows of coordinates), returns their ids
+        points = np.asarray(points, dtype=np.float64)
+        points = points.reshape(len(points), -1)
+        if self.coords is None:
+            self.coords = np.zeros((max(16, len(points)), points.shape[1]))
+            self.offsets = [tuple(d - 1 for d in o) for o in np.ndindex(*([3] * points.shape[1]))]
+        if self.size + len(points) > len(self.coords): #grow by doubling, so inserts stay amortized O(1)
+            grown = np.zeros((max(2 * len(self.coords), self.size + len(points)), self.coords.shape[1]))
+            grown[:self.size] = self.coords[:self.size]
+            self.coords = grown
+        ids = []
+        for p in points:
+            i = self.size
+            self.size += 1
+            self.coords[i] = p
+            cell = tuple(np.floor(p / self.cellSize).astype(np.int64).tolist())
+            self.cellOf.append(cell)
+            self.cells.setdefault(cell, []).append(i)
+            self.counts.append(0)
+            neighbors = self.neighbors(i)
+            self.counts[i] = len(neighbors)
+            for n in neighbors: #the new point is in the neighborhood of each of its neighbors
+                if n != i:
+                    self.counts[n] += 1
+                    if self.counts[n] == self.minpoints: #n just became core
+                        self.makeCore(n, self.neighbors(n))
+            if self.isCore(i):
+                self.makeCore(i, neighbors)
+            ids.append(i)
+        return ids
+    def delete(self, ids): #delete points by id
+        for i in ids:
+            if self.counts[i] == 0: #already deleted
                 continue
-            min_dists = [-1 for i in range(self.clusters)] # array to maintain list of minimum distances between point p and other clusters 
-            #this is for b(i) - average of mimimum distance of point to other clusters
-            for p2 in self.dataset: # for every other point 
-                if(p2.label == -1): # if point outlier then skip over it 
+            neighbors = self.neighbors(i)
+            lost = {i: neighbors} if self.isCore(i) else {} #core points that stop being core -> their neighbors, if known
+            self.cells[self.cellOf[i]].remove(i)
+            if len(self.cells[self.cellOf[i]]) == 0:
+                del self.cells[self.cellOf[i]]
+            self.counts[i] = 0
+            for n in neighbors:
+                if n != i:
+                    self.counts[n] -= 1
+                    if self.counts[n] == self.minpoints - 1:
+                        lost[n] = None
+            seeds = {} #cluster id -> remaining core neighbors of its lost core points
+            for c in lost:
+                cid = self.clusterOf.pop(c)
+                self.members[cid].discard(c)
+                seeds.setdefault(cid, [])
+            for c, near in lost.items(): #a non core point is in no core-core link, so only lost cores can split clusters
+                for n in self.neighbors(c) if near is None else near:
+                    if n in self.clusterOf:
+                        seeds[self.clusterOf[n]].append(n)
+            for cid, s in seeds.items():
+                if len(self.members[cid]) == 0:
+                    del self.members[cid]
+                else:
+                    self.splitCluster(cid, list(dict.fromkeys(s)))
+    def splitCluster(self, cid, seeds): #move the parts of cluster cid no longer linked to the others to new clusters
+        if len(seeds) <= 1:
+            return
+        owner = {s: g for g, s in enumerate(seeds)} #core id -> search that reached it first
+        merged = list(range(len(seeds))) #search -> search it was merged into
+        visited = [set([s]) for s in seeds]
+        frontier = [collections.deque([s]) for s in seeds]
+        growing = list(range(len(seeds)))
+        done = [] #searches that ran out of points - each one walked a whole separate part
+        def top(g):
+            while merged[g] != g:
+                g = merged[g]
+            return g
+        while len(growing) > 1:
+            for g in list(growing):
+                if merged[g] != g: #merged into another search this round
                     continue
-                if(p2.label == p.label): # if p2 is in the same cluster as p
-                    ai_c += 1
-                    ai_sum += p.distanceWith(p2) # add sum and count for a(i)
-                else: #otherwise if p and p2 belong to different clusters 
-                    ind = int(p2.label-1)
-                    if(min_dists[ind] == -1 or min_dists[ind] > p.distanceWith(p2)): #get min distance with p2's cluster
-                        min_dists[ind] = p.distanceWith(p2)
-            bi = sum([d for d in min_dists if d != -1]) / max((len(min_dists)-1), 1) #compute b(i)
-            ai = ai_sum/ai_c #compute a(i)
-            cof = (bi-ai) / max(ai,bi) #get coefficient 
-            cof_sum += cof # add to sum of coefficients
-        return cof_sum/len(self.dataset) #return average coefficient 
-    def resetDataset(self): #method to reset all labels in given dataset
-        for d in dataset:
-            d.resetLabel()    
-
-
-dataset = scio.loadmat(FILENAME)["Points"] #load dataset
-
-##for default parameters minpts=3 and eps = 0.12 
-doSKLearn(dataset, 0.12, 3) #show sklearn result for reference 
-dataset = [Point(t[0], t[1]) for t in dataset] #make dataset list of point objects for my implementation
-dbscan = DBScan(dataset, 0.08, 2) #run my implementation 
-dbscan.runScan()
-dbscan.showResult("My Implementation, eps=0.12 minpts=3, finds "+str(dbscan.clusters) + "clusters") # show results 
-print("For default params, coefficient:",dbscan.getSilouetteCoeff()) #show coefficient 
-##for custom parameters 
-minpts_params = [i for i in range(2, 6)] #possible minpts = 2...6
-dist_params = [i/100 for i in range(8, 24, 4)] #possible eps = 0.08 ... 0.24
-res = [['x' for i in range(len(dist_params) + 1)] for j in range(len(minpts_params) + 1)] #matrix to store avg coefficients for each set of parameters 
-#add index rows and columns to res having parameters 
-#so that user knows what coefficient values correspond to what parameters 
-res[0][0] = 'x'
-for i in range(len(dist_params)):
-    res[0][i+1] = str(dist_params[i])
-for i in range(len(minpts_params)):
-    res[i+1][0] = str(minpts_params[i])
-
-for i, pts in enumerate(minpts_params): #for every possible minpts param
-    for j, eps in enumerate(dist_params): #for every possible eps param 
-        dbscan2 = None
-        dbscan2 = DBScan(dataset, eps, pts) #run dbscan and show result  
-        dbscan2.runScan()
-        dbscan2.showResult("For eps=" + str(eps) + " minpts=" + str(pts)+ " finds "+str(dbscan2.clusters) + "clusters")
-        cof = (dbscan2.getSilouetteCoeff()) # compute average silouette coefficient 
-        res[i+1][j+1] = str(cof) #add it to matrix 
-       
-print(res) #show coefficients 
-with open(OUTDIR + "DBSCAN_RES.csv", "w+") as fw: #write coefficient results to file 
-    out = "\n".join([",".join(r) for r in res])
-    fw.write(out)
+                if len(frontier[g]) == 0:
+                    growing.remove(g)
+                    done.append(g)
+                    continue
+                c = frontier[g].popleft()
+                for n in self.neighbors(c):
+                    if n not in self.clusterOf:
+                        continue
+                    o = owner.get(n)
+                    if o is None:
+                        owner[n] = g
+                        visited[g].add(n)
+                        frontier[g].append(n)
+                        continue
+                    o = top(o)
+                    if o != g: #the searches met - same part
+                        if len(visited[o]) > len(visited[g]):
+                            visited[g], visited[o] = visited[o], visited[g]
+                        visited[g] |= visited[o]
+                        frontier[g].extend(frontier[o])
+                        merged[o] = g
+                        growing.remove(o)
+        if len(growing) == 0: #every part was walked, the largest keeps the cluster id
+            done.remove(max(done, key=lambda g: len(visited[g])))
+        for g in done:
+            new = self.nextCluster
+            self.nextCluster += 1
+            for c in visited[g]:
+                self.clusterOf[c] = new
+            self.members[cid] -= visited[g]
+            self.members[new] = visited[g]
+    def getLabels(self): #ids of the present points and their labels, numbered as DBScan.runScan numbers them
+        ids = [i for i in range(self.size) if self.counts[i] > 0]
+        order = sorted(self.members, key=lambda cid: min(self.members[cid])) #clusters in order of their first core point
+        number = {cid: ci + 1 for ci, cid in enumerate(order)}
+        labels = []
+        for i in ids:
+            if i in self.clusterOf:
+                labels.append(number[self.clusterOf[i]])
+                continue
+            near = [number[self.clusterOf[n]] for n in self.neighbors(i) if n in self.clusterOf]
+            labels.append(min(near) if len(near) > 0 else -1) #border points join the lowest numbered cluster
+        self.clusters = len(order)
+        return np.asarray(ids, dtype=np.int64), np.asarray(labels, dtype=np.int64)
+
+def getCmap(clusters): #Helper function to map a color to each cluster (for visualization )
+    N = clusters
+    color_norm  = colors.Normalize(vmin=0, vmax=N)
+    scalar_map = cmx.ScalarMappable(norm=color_norm, cmap='nipy_spectral') 
+    def map_index_to_rgb_color(index):
+        return scalar_map.to_rgba(index)
+    return map_index_to_rgb_color
+
+def showClusters(points, clusters, title = None): #plot clustered points (first two dimensions)
+    if(title is None):
+        title = "DBSCAN RESULT"
+    plt.title(title) #give plot title 
+    cmap = getCmap(clusters) #get a mapping from cluster number to label
+    coords, labels = points.coords, points.labels
+    for label in np.unique(labels).tolist(): #plot every cluster's points at once with designated cluster's color
+        members = labels == label
+        plt.scatter(coords[members, 0], coords[members, 1], color=cmap(label), marker="x" if label == -1 else "o")
+    plt.savefig(OUTDIR + title+".png", bbox_inches="tight")
+    plt.clf()
+    #plt.show()
+
+def getSilouetteValues(points, rows, clusters, blockBytes = None): #silouette coefficient s(i) of each of the (non outlier) rows
+    blockBytes = SILHOUETTE_BLOCK_BYTES if blockBytes is None else blockBytes
+    labels = points.labels
+    cols = np.nonzero(labels != -1)[0] # outliers are skipped, both as p and as p2 
+    cols = cols[np.argsort(labels[cols], kind="stable")] #grouped by cluster, so each cluster is one run of columns
+    found, starts, sizes = np.unique(labels[cols], return_index=True, return_counts=True)
+    own = np.searchsorted(found, labels[rows]) #position of each row's cluster in found
+    colCoords = points.coords[cols]
+    step = max(1, blockBytes // (16 * max(len(cols), 1))) #rows per block - the distance block and one temporary
+    values = np.empty(len(rows))
+    for b in range(0, len(rows), step):
+        block = points.coords[rows[b:b+step]]
+        dists = np.zeros((len(block), len(cols))) #same sum of squares, dimension by dimension, as PointSet.distancesFrom
+        for k in range(points.getDim()):
+            dists += (colCoords[:, k][None, :] - block[:, k][:, None]) ** 2
+        np.sqrt(dists, out=dists)
+        blockOwn = own[b:b+step]
+        at = np.arange(len(block))
+        ai = np.add.reduceat(dists, starts, axis=1)[at, blockOwn] / sizes[blockOwn] #a(i) - average distance with points in its cluster (itself included)
+        min_dists = np.minimum.reduceat(dists, starts, axis=1) #minimum distance of point to every cluster
+        min_dists[at, blockOwn] = 0
+        bi = min_dists.sum(axis=1) / max((clusters-1), 1) #b(i) - sum of minimum distances to other clusters over (clusters - 1)
+        values[b:b+step] = (bi-ai) / np.maximum(ai,bi)
+    return values
+
+def getSilouetteCoeff(points, clusters, blockBytes = None): # average silouette coefficient of the clustering in points.labels - intrinsic performance indicator 
+    #computed a block of rows at a time, peak memory of the distances is about blockBytes
+    if(clusters == 0): # if no clusters created then 0 score 
+        return 0
+    rows = np.nonzero(points.labels != -1)[0]
+    return float(getSilouetteValues(points, rows, clusters, blockBytes).sum() / len(points)) #outliers count as 0 in the average 
+
+#estimate getSilouetteCoeff from about sampleSize points, sampled from every cluster in proportion to its size
+#returns (estimate, standard error of the estimate) - the error is 0 when every point ends up sampled
+def getSilouetteEstimate(points, clusters, sampleSize, seed = 0, blockBytes = None):
+    if(clusters == 0):
+        return 0, 0
+    rng = np.random.default_rng(seed)
+    labels = points.labels
+    rows = np.nonzero(labels != -1)[0]
+    strata = [] #one stratum per cluster - (cluster size, sampled rows)
+    for label in np.unique(labels[rows]).tolist():
+        stratum = rows[labels[rows] == label]
+        take = min(len(stratum), max(2, int(round(sampleSize * len(stratum) / len(rows)))))
+        strata.append((len(stratum), rng.choice(stratum, take, replace=False)))
+    values = getSilouetteValues(points, np.concatenate([s[1] for s in strata]), clusters, blockBytes) #all samples in one pass
+    total = 0
+    variance = 0
+    at = 0
+    for size, sample in strata:
+        sampled = values[at:at+len(sample)]
+        at += len(sample)
+        total += size * sampled.mean()
+        if len(sample) < size: #finite population correction, sampling without replacement
+            variance += size ** 2 * (1 - len(sample) / size) * sampled.var(ddof=1) / len(sample)
+    return float(total / len(points)), math.sqrt(variance) / len(points)
+
+
+def writeSweepResults(res, minpts_params, dist_params): #write a sweep's (minpts, eps) -> (clusters, coefficient) results to file
+    #matrices of avg coefficients and of clusters found, with index rows and columns having parameters 
+    #so that user knows what values correspond to what parameters 
+    cofs = [['x'] + [str(eps) for eps in dist_params]]
+    clusters = [['x'] + [str(eps) for eps in dist_params]]
+    for pts in minpts_params:
+        cofs.append([str(pts)] + [str(res[(pts, eps)][1]) for eps in dist_params])
+        clusters.append([str(pts)] + [str(res[(pts, eps)][0]) for eps in dist_params])
+    with open(OUTDIR + "DBSCAN_RES.csv", "w+") as fw: #write coefficient results to file 
+        fw.write("\n".join([",".join(r) for r in cofs]))
+    with open(OUTDIR + "DBSCAN_CLUSTERS.csv", "w+") as fw: #write number of clusters found to file 
+        fw.write("\n".join([",".join(r) for r in clusters]))
+    return cofs
+
+if __name__ == "__main__":
+    dataset = scio.loadmat(FILENAME)["Points"] #load dataset
+
+    ##for default parameters minpts=3 and eps = 0.12 
+    doSKLearn(dataset, 0.12, 3) #show sklearn result for reference 
+    points = PointSet(dataset) #columnar copy of the dataset for my implementation
+    dbscan = DBScan(points, 0.08, 2) #run my implementation 
+    dbscan.runScan()
+    dbscan.showResult("My Implementation, eps=0.12 minpts=3, finds "+str(dbscan.clusters) + "clusters") # show results 
+    print("For default params, coefficient:",dbscan.getSilouetteCoeff()) #show coefficient 
+    ##for custom parameters 
+    res = {} #(minpts, eps) -> (clusters, coefficient)
+    sweep = DBScanSweep(points, DIST_PARAMS, MINPTS_PARAMS) #neighbors are computed once for the whole grid
+    for pts in MINPTS_PARAMS: #for every possible minpts param
+        for eps in DIST_PARAMS: #for every possible eps param 
+            clusters = sweep.apply(eps, pts) #cluster with this pair and show result 
+            showClusters(points, clusters, "For eps=" + str(eps) + " minpts=" + str(pts)+ " finds "+str(clusters) + "clusters")
+            res[(pts, eps)] = (clusters, getSilouetteCoeff(points, clusters)) # compute average silouette coefficient 
+    print(writeSweepResults(res, MINPTS_PARAMS, DIST_PARAMS)) #show coefficients 
@@ -5,120 +5,238 @@ import matplotlib.pyplot as plt
 import matplotlib.cm as cmx
 import matplotlib.colors as colors
 import scipy.io as scio
-from scipy.stats import multivariate_normal
+from scipy.linalg import solve_triangular
+from scipy.special import logsumexp
 import numpy as np 
+from point_store import PointSet, readPointChunks
 
 FILENAME = "GMM-Points.mat"
 OUTDIR = "emgmm_outs/"  #directory in which output files will be stored
+ROUNDS = 3 #number of times EM is run from a new random initialization
+MODE = "soft" #soft or hard assignment of points to clusters, see GMM
+INIT = "kmeans++" #how GMM picks its starting parameters, kmeans++ or random
+COVARIANCE_TYPE = "full" #shape of the cluster covariances - full, diag, spherical or tied, see GMM
+LOGLIK_TOL = 1e-6 #soft mode stops when the log-likelihood per point changes less than this
+MAX_ITER = 500 #most iterations run by iterateToConverge
+STEP_DECAY = 0.6 #online EM step size is (chunks seen + 2) ^ -STEP_DECAY
+CHUNK_ROWS = 100 #rows per chunk when the points are streamed to online EM
+COV_REG = 1e-6 #ridge (relative to the average variance) added to a covariance matrix that is singular
 
-class Point: 
-    '''
-    Helper point class 
-    Each member in dataset needs to be a point before it can be processed by DBScan class
-    Following labels possible:
-        -1 - Undefined
-        1 ... n - belongs to cluster 1...n
-    '''
-    def __init__(self, x, y): #initialize point with given coordinates and undefined label
-        self.x = x
-        self.y = y
-        self.label = -1 #undefined label
-        self.round = None # keep track of which round of emgmm youre performing - initially none
-    def distanceWith(self, p2): #compute euclidian distance with another point 
-        return math.sqrt(math.pow((p2.x - self.x), 2) + math.pow((p2.y - self.y), 2))
-    def equals(self, p2):
-        return self.x == p2.x and self.y == p2.y
-    def resetLabel(self): #reset label to undefined
-        self.label = -2
-    def __str__(self): #for pretty printing 
-        return str(self.x) + ", " + str(self.y)
+def choleskyFactor(cov): #lower cholesky factor of a covariance matrix, a singular one gets a small ridge first
+    try:
+        return np.linalg.cholesky(cov)
+    except np.linalg.LinAlgError:
+        return np.linalg.cholesky(cov + COV_REG * max(1.0, np.trace(cov) / len(cov)) * np.eye(len(cov)))
+
+def toCovarianceType(covs, counts, covType): #full covariance matrices of the clusters -> their covariances as covType stores them
+    if covType == "diag": #variance of each dimension
+        return [np.diag(c).copy() for c in covs]
+    if covType == "spherical": #one variance for all dimensions
+        return [np.asarray(np.diag(c).mean()) for c in covs]
+    if covType == "tied": #one matrix shared by all clusters, the clusters' average weighted by their number of points
+        shared = sum(w * c for w, c in zip(counts, covs)) / max(sum(counts), np.finfo(np.float64).tiny)
+        return [shared] * len(covs)
+    return list(covs)
+
+def kmeansPlusPlus(coords, k, rng): #k initial centers - each drawn with probability proportional to its squared distance to the nearest center so far
+    centers = [coords[rng.integers(len(coords))]]
+    d2 = ((coords - centers[0]) ** 2).sum(axis=1)
+    for i in range(1, k):
+        cumulative = np.cumsum(d2)
+        if cumulative[-1] <= 0: #every point is on a center already
+            pick = rng.integers(len(coords))
+        else:
+            pick = min(int(np.searchsorted(cumulative, rng.random() * cumulative[-1], side="right")), len(coords) - 1)
+        centers.append(coords[pick])
+        d2 = np.minimum(d2, ((coords - coords[pick]) ** 2).sum(axis=1))
+    return np.asarray(centers)
 
 class GaussianCluster:
     '''
     Helper gaussian cluster class - used to represent each gaussian cluster in gmm mode 
-
+    stdevs holds the covariance as covType stores it - a full matrix (full and tied), a vector of variances 
+    (diag) or a single variance (spherical) 
     '''
-    def __init__(self, mus, sigmas, weight, label):
-        self.n = 2 #number of dimensions 
+    def __init__(self, mus, sigmas, weight, label, covType = "full"):
+        self.n = len(mus) #number of dimensions 
         self.means = mus #mean values 
         self.stdevs = np.asarray(sigmas) #covarance matrix 
         self.weight = weight #weight of cluster
         self.label = label #label of cluster 
-    def getPdf(self, p): #method to get weighted nd multivariate normal pdf 
-        return multivariate_normal.pdf([p.x,p.y],self.means, self.stdevs, allow_singular=True) * self.weight
+        self.covType = covType
+        self.factor = None #cholesky factor of a full covariance matrix
+        self.factorOf = None #covariance matrix the factor was computed from
+    def getFactor(self): #cholesky factor of a full covariance, computed once for every new covariance matrix
+        if self.factorOf is not self.stdevs:
+            self.factor = choleskyFactor(self.stdevs)
+            self.factorOf = self.stdevs
+        return self.factor
+    def getLogPdf(self, coords): #log of the weighted nd multivariate normal pdf of every row of coords
+        diff = coords - self.means
+        if self.covType == "diag": #O(n d) - no matrix at all
+            var = np.maximum(self.stdevs, COV_REG)
+            maha = (diff ** 2 / var).sum(axis=1)
+            logdet = np.log(var).sum()
+        elif self.covType == "spherical":
+            var = max(float(self.stdevs), COV_REG)
+            maha = (diff ** 2).sum(axis=1) / var
+            logdet = self.n * math.log(var)
+        else:
+            chol = self.getFactor()
+            maha = (solve_triangular(chol, diff.T, lower=True) ** 2).sum(axis=0) #whitened differences, so no inverse is formed
+            logdet = 2 * np.log(np.diag(chol)).sum()
+        return math.log(self.weight) - 0.5 * (self.n * math.log(2 * math.pi) + logdet + maha)
+    def getPdf(self, coords): #method to get weighted nd multivariate normal pdf of every row of coords
+        return np.exp(self.getLogPdf(coords))
+
+def getLogPdfs(clusters, coords): #log of the weighted pdf of every row of coords in every cluster (n x k)
+    if clusters[0].covType in ("diag", "spherical"): #all clusters at once - squared distances scaled by the variances as 3 matrix products
+        dim = coords.shape[1]
+        var = np.maximum(np.stack([np.broadcast_to(c.stdevs, (dim,)) for c in clusters]), COV_REG) #k x d
+        means = np.stack([np.asarray(c.means, dtype=np.float64) for c in clusters])
+        prec = 1 / var
+        maha = (coords ** 2) @ prec.T - 2 * (coords @ (means * prec).T) + (means ** 2 * prec).sum(axis=1)
+        maha = np.maximum(maha, 0) #cancellation can leave tiny negatives
+        logw = np.log([c.weight for c in clusters])
+        return logw - 0.5 * (dim * math.log(2 * math.pi) + np.log(var).sum(axis=1) + maha)
+    if clusters[0].covType != "tied":
+        return np.column_stack([c.getLogPdf(coords) for c in clusters])
+    chol = clusters[0].getFactor() #shared matrix - one factor, and the points are whitened once for all clusters
+    white = solve_triangular(chol, coords.T, lower=True)
+    const = len(chol) * math.log(2 * math.pi) + 2 * np.log(np.diag(chol)).sum()
+    return np.column_stack([math.log(c.weight) - 0.5 * (const + ((white - solve_triangular(chol, np.asarray(c.means, dtype=np.float64), lower=True)[:, None]) ** 2).sum(axis=0))
+        for c in clusters])
+
+def getResponsibilities(clusters, coords): #responsibility of every cluster for every row of coords (n x k) and the log-likelihood
+    logp = getLogPdfs(clusters, coords) #log of weighted pdf of every point in every cluster
+    lognorm = logsumexp(logp, axis=1, keepdims=True) #log of the sum of each point's pdfs, without underflow
+    return np.exp(logp - lognorm), float(lognorm.sum())
 
 class GMM:
     '''
     GMM class - represents the GMM model 
+    init picks the starting parameters:
+        kmeans++ - means are k-means++ centers, each cluster starts with the covariance and share of the points 
+                   closest to its center (shares are 1/k in hard mode, whose weights stay fixed) 
+        random - means and variances drawn uniformly from [0.1, 1] 
+    both draw from the random module, so random.seed makes a run repeatable 
+    mode picks how points are shared between clusters in the maximization step:
+        soft - every point counts towards every cluster by its responsibility, weights are re-estimated and 
+               iterations stop when the log-likelihood stops improving 
+        hard - every point counts only towards the cluster it is most likely in (with 0.001 * n added to every 
+               cluster's count), weights stay fixed and iterations stop when the parameters stop changing 
+    covType picks the shape of the covariances, cheaper ones scale better with the number of dimensions d:
+        full - any covariance matrix, O(d^3) per cluster to factor and O(n d^2) to evaluate 
+        diag - independent dimensions, O(n d) 
+        spherical - one variance for all dimensions, O(n d) 
+        tied - one full matrix shared by all clusters, factored and applied to the points once per iteration 
     '''
-    def __init__(self, dataset, k): #initialize parameters
-        self.dataset = dataset #list of points
+    def __init__(self, points, k, mode = None, init = None, covType = None): #initialize parameters
+        self.points = points #PointSet (any number of dimensions), the clustering is written to points.labels
         self.resetDataset() #clear previous labels 
-        self.dim = 2 # dimensions in dataset
+        self.dim = points.getDim() # dimensions in dataset
+        self.mode = MODE if mode is None else mode
+        self.covType = COVARIANCE_TYPE if covType is None else covType
+        self.round = None # keep track of which round of emgmm youre performing - initially none
+        self.loglik = None #log-likelihood of the dataset under the parameters of the last expectation step
         self.clusters = [] #list representing clusters
+        if (INIT if init is None else init) == "kmeans++":
+            self.initKMeansPlusPlus(k)
+            return
         mean_mat = [[random.randint(10,100)/100 for i in range(self.dim)] for kl in range(k)] # randomly initialize mean values for each cluster 
         stdev_mat = [[random.randint(10,100)/100 for i in range(self.dim)] for kl in range(k)] # randomly initialize covariance matrix for each cluster
+        stdev_mat = toCovarianceType([np.diag(s) for s in stdev_mat], [1] * k, self.covType) #reshape to be covariance matrices (initially assuming all dimensions independent)
         for i in range(k): # for each cluster
-            stdev_mat_t = [[stdev_mat[i][0], 0], [0, stdev_mat[i][1]]] #reshape to be covariance matrix (initially assuming X, Y independent)
-            self.clusters.append(GaussianCluster(mean_mat[i],stdev_mat_t, (1/k), i)) #add cluster to list
+            self.clusters.append(GaussianCluster(mean_mat[i],stdev_mat[i], (1/k), i, self.covType)) #add cluster to list
+    def initKMeansPlusPlus(self, k): #clusters centered on k-means++ centers
+        coords = self.points.coords
+        centers = kmeansPlusPlus(coords, k, np.random.default_rng(random.getrandbits(64)))
+        nearest = np.argmin(np.column_stack([((coords - c) ** 2).sum(axis=1) for c in centers]), axis=1) #closest center of every point
+        overall = np.diag(np.atleast_1d(coords.var(axis=0)) + COV_REG) #for clusters with too few points of their own
+        counts = np.bincount(nearest, minlength=k)
+        sigs = [np.cov(coords[nearest == i].T, bias=True).reshape(self.dim, self.dim) if counts[i] > self.dim else overall for i in range(k)]
+        sigs = toCovarianceType(sigs, counts, self.covType)
+        for i in range(k):
+            weight = 1/k if self.mode == "hard" else max(counts[i], 1) / len(coords)
+            self.clusters.append(GaussianCluster(centers[i], sigs[i], weight, i, self.covType))
+    def setParameters(self, params): #replace the clusters with (mean, covariance, weight) of each
+        self.clusters = [GaussianCluster(np.asarray(m), s, w, i, self.covType) for i, (m, s, w) in enumerate(params)]
+    def getParameters(self): #(mean, covariance, weight) of each cluster
+        return [(np.asarray(c.means), c.stdevs, c.weight) for c in self.clusters]
     def resetDataset(self): # helper function to reset dataset labels 
-        for d in dataset:
-            d.resetLabel()
-    def expectationMax(self): #method to perform one round of expectation and maximization
-        #mc_list - maintains list of # of points in a cluster, for max step
-        mc_list = [0.001*len(self.dataset) for d in range(len(self.clusters))]
-        ##EXPECTATION STEP 
-        for i, p in enumerate(self.dataset): # for each point in dataset
-            maxlabel = 0 # maintain cluster label that has maximum belongingless
-            maxval = -1 # maintain maximum belongingness
-            normalizer = sum([c.getPdf(p) for c in self.clusters]) #compute sum of pdfs of point in each cluster
-            for j, c in enumerate(self.clusters): # for each cluster
-                val = c.getPdf(p) / normalizer #compute belongingness to cluster
-                if(val > maxval): # assign cluster label to point if point has higher belongingness to that cluster 
-                    maxval = val
-                    maxlabel = c.label
-            mc_list[maxlabel] += 1 # increment # of points in the cluster with which point has highest belongingness
-            p.label = maxlabel # assign point to that cluster 
-        ##MAXIMIZATION STEP 
+        self.points.resetLabels()
+    def expectation(self): #responsibility of every cluster for every point (n x k) and the log-likelihood, computed in log space
+        return getResponsibilities(self.clusters, self.points.coords)
+    def maximization(self, resp): #new (mean, covariance, weight) of every cluster from the responsibilities
+        coords = self.points.coords
+        n = len(self.points)
+        if self.mode == "hard":
+            likeliest = np.argmax(resp, axis=1) #first most likely cluster of every point
+            resp = np.zeros_like(resp)
+            resp[np.arange(n), likeliest] = 1
+            mc_list = 0.001*n + resp.sum(axis=0) #maintains # of points in each cluster
+        else:
+            mc_list = resp.sum(axis=0) + 10 * np.finfo(np.float64).eps #effective # of points in each cluster, never 0
+        means = (resp.T @ coords) / mc_list[:, None] #recompute means - weighted sums of the points
+        if self.covType in ("diag", "spherical"): #weighted sum of (p - mu)^2 expanded, one matrix product for all clusters
+            var = (resp.T @ (coords ** 2)) / mc_list[:, None] - 2 * means ** 2 + means ** 2 * (resp.sum(axis=0) / mc_list)[:, None]
+            var = np.maximum(var, 0)
+            sigs = list(var) if self.covType == "diag" else [np.asarray(v.mean()) for v in var]
+        else:
+            sigs = []
+            for j, c in enumerate(self.clusters): #for each cluster
+                diff_ximu = coords - means[j] #compute vectors p - mu
+                #recompute covariance matrix - weighted sum of outer products 
+                sigs.append(((diff_ximu * resp[:, j, None]).T @ diff_ximu) / (mc_list[j] if self.covType == "full" else 1))
+            if self.covType == "tied": #all clusters' outer products over all their points
+                sigs = [sum(sigs) / mc_list.sum()] * len(self.clusters)
         res = [0 for i in self.clusters] #maintain list of results for each cluster 
-        for j, c in enumerate(self.clusters): #for each cluster
-            #recompute mean 
-            mu = np.zeros((1, self.dim))
-            for i, p in enumerate(self.dataset): # take sum of all points in dataset that belong to this cluster 
-                mu = mu + (np.asarray([p.x, p.y]) * int(p.label == c.label))
-            mu = ((1/mc_list[c.label]) * mu)[0] # normalize and reshape 
-            #recompute covariance matrix 
-            sig = np.zeros((self.dim, self.dim))
-            for i, p in enumerate(self.dataset): # for all points in dataset
-                diff_ximu = np.asarray([p.x, p.y]) - mu #compute vector p - mu where p is point (1x2 vector)
-                prod = (np.reshape(diff_ximu, (self.dim, 1)) * diff_ximu) * int(p.label == c.label) # compute new 2x2 matrix for p 
-                sig = np.add(sig, prod) # add that to covariance result 
-            sig = (1/mc_list[c.label]) * sig #normalize covariance matrix 
-            res[c.label] = (mu, sig) 
-        return res 
-    # method that performs expectation maximization on dataset repeatedly until change in parameters < eps
-    def iterateToConverge(self, eps = 0.01, showall = False): 
-        print("Error threshold set to", eps)
+        for j, c in enumerate(self.clusters):
+            res[c.label] = (means[j], sigs[j], c.weight if self.mode == "hard" else mc_list[j] / n)
+        return res
+    def assignLabels(self): #expectation step that also labels each point with its most likely cluster (first one on ties), returns the responsibilities
+        resp, self.loglik = self.expectation()
+        self.points.labels[:] = np.asarray([c.label for c in self.clusters])[np.argmax(resp, axis=1)]
+        return resp
+    def expectationMax(self): #method to perform one round of expectation and maximization
+        return self.maximization(self.assignLabels())
+    # method that performs expectation maximization on dataset repeatedly until it converges - change in parameters < eps 
+    # in hard mode, change in log-likelihood per point < LOGLIK_TOL in soft mode - or maxIter iterations are done
+    # stop(iteration, loglik, previous loglik) is called after every iteration and ends the run early when it returns True
+    # returns why it stopped - "converged", "maxIter" or "stopped"
+    def iterateToConverge(self, eps = 0.01, showall = False, maxIter = None, stop = None, verbose = True): 
+        maxIter = MAX_ITER if maxIter is None else maxIter
+        log = print if verbose else (lambda *args: None)
+        log("Error threshold set to", eps if self.mode == "hard" else LOGLIK_TOL)
         iteration = 0 # maintain how many iterations passed 
+        prev = None #log-likelihood of the previous iteration
         while(True):
             delta_mu = 0 #maintain sum of change in mu parameter
             delta_sig = 0 # maintain sum of change in sigma parameter
             iteration += 1
-            print("At iteration #"+str(iteration))
+            log("At iteration #"+str(iteration))
             res = self.expectationMax() #run one iteration of expectation maximization
             for i, c in enumerate(self.clusters): #for each cluster 
-                tmp = np.subtract(res[i][0], np.asarray(c.means)).tolist() #get difference between updated and old mean 
-                delta_mu += sum([math.fabs(i) for i in tmp]) #take sum of absolute of all values in matrix 
-                tmp = np.subtract(res[i][1], np.asarray(c.stdevs)).tolist() #get difference between updated and old covarance matrix 
-                delta_sig += sum([sum([math.fabs(i) for i in t]) for t in tmp]) #take sum of absolute of all values in the matirx 
+                delta_mu += np.abs(res[i][0] - np.asarray(c.means)).sum() #take sum of absolute of all changes in mean 
+                delta_sig += np.abs(res[i][1] - c.stdevs).sum() #take sum of absolute of all changes in covarance matrix 
                 self.clusters[i].means = res[i][0] #assign cluster new mean 
                 self.clusters[i].stdevs = res[i][1] #assign cluster new covariance 
-                print("\tCLUSTER", c.label)
-                print("\t\tmean: ", res[i][0])
+                self.clusters[i].weight = res[i][2] #assign cluster new weight 
+                log("\tCLUSTER", c.label)
+                log("\t\tmean: ", res[i][0])
+            log("\tlog-likelihood:", self.loglik)
             if(showall == True): # show each iteration if parameter set 
                 self.showResult(iteration = iteration)
-            if(delta_mu < eps and delta_sig < eps): # if change in mu and sigma below threshold then stop 
-                break
+            if self.mode == "hard":
+                if(delta_mu < eps and delta_sig < eps): # if change in mu and sigma below threshold then stop 
+                    return "converged"
+            elif prev is not None and abs(self.loglik - prev) < LOGLIK_TOL * len(self.points): # if likelihood stopped improving then stop 
+                return "converged"
+            if stop is not None and stop(iteration, self.loglik, prev):
+                return "stopped"
+            prev = self.loglik
+            if iteration >= maxIter:
+                return "maxIter"
     def getCmap(self): #Helper function to map a color to each cluster (for visualization )
         N = len(self.clusters)
         color_norm  = colors.Normalize(vmin=0, vmax=N-1)
@@ -135,13 +253,71 @@ class GMM:
             title += " Iteration #" + str(iteration)
         plt.title(title) #give plot title 
         cmap = self.getCmap() #get a mapping from cluster number to label
-        for p in self.dataset:
-            plt.scatter([p.x], [p.y], color=cmap(p.label)) #for each point plot it on graph with designated cluster's color
+        coords, labels = self.points.coords, self.points.labels
+        for label in np.unique(labels).tolist(): #plot every cluster's points at once with designated cluster's color (first two dimensions)
+            members = labels == label
+            plt.scatter(coords[members, 0], coords[members, 1], color=cmap(label))
         plt.savefig(OUTDIR + title+".png", bbox_inches="tight") #save plot
         plt.clf()
         #plt.show()
              
-dataset_o = scio.loadmat(FILENAME)["Points"]
+class OnlineGMM:
+    '''
+    Stepwise online EM - fits a GMM to chunks of points as they arrive, each chunk is seen once 
+    The model is kept as running averages of the sufficient statistics (responsibility, responsibility * x and 
+    responsibility * x x^T of each cluster). Every chunk gets an expectation step under the current parameters 
+    and its statistics are blended into the running ones with step size (chunks seen + 2) ^ -decay, then the 
+    parameters are read back off the statistics - so the model is usable after every chunk 
+    decay in (0.5, 1] - lower forgets old chunks faster, which suits data that drifts 
+    '''
+    def __init__(self, k, decay = None, covType = None):
+        self.k = k
+        self.decay = STEP_DECAY if decay is None else decay
+        self.covType = COVARIANCE_TYPE if covType is None else covType
+        self.clusters = [] #current clusters, empty until the first chunk
+        self.stats = None #running (weights, weighted sums, weighted outer products)
+        self.steps = 0 #chunks seen
+        self.loglik = None #log-likelihood per point of the last chunk, under the parameters it was seen with
+    def getStatistics(self, coords): #average sufficient statistics of a chunk under the current parameters
+        resp, loglik = getResponsibilities(self.clusters, coords)
+        s0 = resp.mean(axis=0)
+        s1 = resp.T @ coords / len(coords)
+        s2 = np.stack([(coords * resp[:, j, None]).T @ coords for j in range(self.k)]) / len(coords)
+        return (s0, s1, s2), loglik / len(coords)
+    def partialFit(self, chunk): #update the model with one chunk of rows
+        coords = np.asarray(chunk, dtype=np.float64)
+        coords = coords.reshape(len(coords), -1)
+        if len(coords) == 0:
+            return self
+        if len(self.clusters) == 0: #first chunk - start from k-means++ on it
+            self.clusters = GMM(PointSet(coords, undefined = -1), self.k, "soft", "kmeans++", self.covType).clusters
+        stats, self.loglik = self.getStatistics(coords)
+        if self.stats is None:
+            self.stats = stats
+        else:
+            step = (self.steps + 2) ** -self.decay
+            self.stats = tuple((1 - step) * old + step * new for old, new in zip(self.stats, stats))
+        self.steps += 1
+        s0, s1, s2 = self.stats
+        s0 = s0 + 10 * np.finfo(np.float64).eps #never 0
+        means = s1 / s0[:, None]
+        sigs = toCovarianceType([s2[j] / s0[j] - np.outer(means[j], means[j]) for j in range(self.k)], s0, self.covType)
+        for j, c in enumerate(self.clusters): #maximization step on the running statistics
+            c.means = means[j]
+            c.stdevs = sigs[j]
+            c.weight = s0[j] / s0.sum()
+        return self
+    def fit(self, chunks): #update the model with every chunk of an iterator, e.g. point_store.readPointChunks
+        for chunk in chunks:
+            self.partialFit(chunk)
+        return self
+    def getParameters(self): #(mean, covariance, weight) of each cluster, as GMM.getParameters
+        return [(np.asarray(c.means), c.stdevs, c.weight) for c in self.clusters]
+    def predict(self, points): #write the most likely cluster of every point to points.labels, returns the log-likelihood
+        resp, loglik = getResponsibilities(self.clusters, points.coords)
+        points.labels[:] = np.argmax(resp, axis=1)
+        return loglik
+
 def showOriginal(data): #METHOD TO SHOW THE ORIGINAL DATASET (WITH LABEL)
     def getCmap(): #same as class method GMM.getCmap()
         N = 2 #known fixed number of clusters 
@@ -152,32 +328,38 @@ def showOriginal(data): #METHOD TO SHOW THE ORIGINAL DATASET (WITH LABEL)
         return map_index_to_rgb_color
     def showResult(dataset): #same as class method GMM.showResult()
         cmap = getCmap()
-        for p in dataset:
-            plt.scatter([p[0]], [p[1]], color=cmap(int(p[2])))
+        for label in np.unique(dataset[:, 2]).tolist(): #plot each labelled group at once
+            members = dataset[:, 2] == label
+            plt.scatter(dataset[members, 0], dataset[members, 1], color=cmap(int(label)))
         title = "Original dataset"
         plt.savefig(OUTDIR + title+".png", bbox_inches="tight") #save plot
         plt.clf()
         #plt.show()
     showResult(data)
-showOriginal(dataset_o)
-dataset = [Point(t[0], t[1]) for t in dataset_o] #convert to list of point objects
-ROUNDS = 3
-avg_acc = [] #maintain accuracy for each round
-for i in range(ROUNDS): #for ROUNDS times 
-    gmm = GMM(dataset, 2) #initialize GMM 
-    gmm.round = i
-    gmm.iterateToConverge(showall=True) #do expectation maximization until little change in parameters
-    gmm.showResult() #show result
-    acc = 0
-    for i, d in enumerate(dataset): #for each point in dataset
-        if d.label == dataset_o[i][2]: #if labels same then increment accuracy count 
-            acc += 1
-    avg_acc.append(max((acc / len(dataset)), 1-(acc / len(dataset)))) #take max of (acc, 1-acc) as clustering labels may have been flipped 
 
-with open(OUTDIR + "accs.txt", "w+") as fw: #output accuracy stats to file
-    for i, a in enumerate(avg_acc):
-        fw.write("ITERATION "+str(i) + ": "+str(a) + "\n")
-    fw.write("AVERAGE: "+str((sum(avg_acc) / len(avg_acc))) + "\n")
-    
-        
-        
+def getAccuracy(labels, truth): #fraction of points labelled as in truth
+    acc = np.count_nonzero(labels == truth) #number of points whose labels are the same
+    return float(max((acc / len(labels)), 1-(acc / len(labels)))) #take max of (acc, 1-acc) as clustering labels may have been flipped 
+
+def writeAccuracies(avg_acc): #output accuracy stats of every round to file, a round that failed is written as "failed" and left out of the average
+    done = [a for a in avg_acc if a != "failed"]
+    with open(OUTDIR + "accs.txt", "w+") as fw:
+        for i, a in enumerate(avg_acc):
+            fw.write("ITERATION "+str(i) + ": "+str(a) + "\n")
+        fw.write("AVERAGE: "+str((sum(done) / len(done))) + "\n")
+
+if __name__ == "__main__":
+    dataset_o = scio.loadmat(FILENAME)["Points"]
+    showOriginal(dataset_o)
+    points = PointSet(dataset_o[:, :2], undefined = -1) #columnar copy of the coordinates, label column left out
+    avg_acc = [] #maintain accuracy for each round
+    for i in range(ROUNDS): #for ROUNDS times 
+        gmm = GMM(points, 2) #initialize GMM 
+        gmm.round = i
+        gmm.iterateToConverge(showall=True) #do expectation maximization until little change in parameters
+        gmm.showResult() #show result
+        avg_acc.append(getAccuracy(points.labels, dataset_o[:, 2]))
+    writeAccuracies(avg_acc)
+    online = OnlineGMM(2).fit(readPointChunks(FILENAME, CHUNK_ROWS, columns=[0, 1])) #same points streamed in chunks, seen once
+    online.predict(points)
+    print("Online EM accuracy:", getAccuracy(points.labels, dataset_o[:, 2]))
@@ -0,0 +1,170 @@
+#!usr/bin/python3
+import concurrent.futures as cf
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from multiprocessing import shared_memory
+import os
+import random
+import numpy as np
+import scipy.io as scio
+import cluster_dbscan
+import cluster_emgmm
+from point_store import PointSet
+
+WORKERS = os.cpu_count() or 1 #number of worker processes runs are spread over
+SEED = 0 #base seed - EM-GMM round (or restart) i is always seeded with SEED + i, whichever worker runs it
+RESTARTS = 8 #EM-GMM restarts raced against each other by runGMMRestarts
+EARLY_STOP_MIN_ITER = 5 #iterations every restart gets before it can be stopped
+#a restart is stopped once, at its last improvement per iteration, it would need more than this many iterations
+#to reach the best log-likelihood any restart has reached so far
+EARLY_STOP_HORIZON = 20
+
+def shareArray(arr): #copy an array into a new shared memory block, returns the block and the spec workers attach to it with
+    shm = shared_memory.SharedMemory(create=True, size=max(1, arr.nbytes))
+    np.ndarray(arr.shape, arr.dtype, buffer=shm.buf)[...] = arr
+    return shm, (shm.name, arr.shape, arr.dtype.str)
+
+def attachArray(spec): #view of a shared array in a worker, the block must stay referenced while the view is used
+    name, shape, dtype = spec
+    shm = shared_memory.SharedMemory(name=name)
+    return shm, np.ndarray(shape, np.dtype(dtype), buffer=shm.buf)
+
+worker = {} #state of a worker process, set up once by initWorker
+
+def initWorker(specs, params, best = None): #attach every shared array (name -> spec), nothing is copied into the worker
+    worker["params"] = params
+    worker["best"] = best #shared best log-likelihood of the restarts, if racing them
+    worker["blocks"] = [] #keeps the shared memory blocks open
+    for name, spec in specs.items():
+        shm, arr = attachArray(spec)
+        worker["blocks"].append(shm)
+        worker[name] = arr
+
+def dbscanTask(task): #one (minpts, eps) cell of the DBSCAN grid -> (clusters, silouette coefficient)
+    pts, eps, plot = task
+    if "sweep" not in worker: #neighbors are computed once per worker for the whole grid
+        worker["points"] = PointSet(worker["coords"]) #coordinates stay in shared memory, only labels are the worker's own
+        worker["sweep"] = cluster_dbscan.DBScanSweep(worker["points"], worker["params"]["epsilons"], worker["params"]["minpoints"])
+    points = worker["points"]
+    clusters = worker["sweep"].apply(eps, pts)
+    if plot:
+        cluster_dbscan.showClusters(points, clusters, "For eps=" + str(eps) + " minpts=" + str(pts)+ " finds "+str(clusters) + "clusters")
+    return clusters, cluster_dbscan.getSilouetteCoeff(points, clusters)
+
+def gmmTask(task): #one EM-GMM round -> accuracy against the known labels
+    rnd, seed, k, plot = task
+    random.seed(seed) #GMM draws its initial parameters from random
+    points = PointSet(worker["coords"], undefined = -1)
+    gmm = cluster_emgmm.GMM(points, k)
+    gmm.round = rnd
+    gmm.iterateToConverge(showall=plot)
+    if plot:
+        gmm.showResult()
+    return cluster_emgmm.getAccuracy(points.labels, worker["truth"])
+
+def gmmRestartTask(task): #one EM-GMM restart -> (how it ended, log-likelihood, parameters)
+    rnd, seed, k, mode = task
+    random.seed(seed)
+    gmm = cluster_emgmm.GMM(PointSet(worker["coords"], undefined = -1), k, mode)
+    best = worker["best"]
+    def fallingBehind(iteration, loglik, prev): #EM only ever raises the log-likelihood, so a restart's current one is a floor for it
+        with best.get_lock():
+            best.value = max(best.value, loglik)
+            lead = best.value
+        if iteration < EARLY_STOP_MIN_ITER or prev is None:
+            return False
+        return lead - loglik > max(loglik - prev, 0) * EARLY_STOP_HORIZON
+    status = gmm.iterateToConverge(stop=fallingBehind, verbose=False)
+    return status, gmm.loglik, gmm.getParameters()
+
+#run fn on every task in a pool of worker processes, each set up with initWorker(specs, params, best)
+#returns the results aligned with tasks and the positions of the tasks that failed (their result is None)
+#a crashed worker breaks the whole pool and fails every task still in it, so those tasks are run again one
+#pool per task - only a task that crashes its own worker is lost
+def runTasks(fn, tasks, specs, params, workers = None, best = None):
+    workers = WORKERS if workers is None else workers
+    results = [None] * len(tasks)
+    failed = []
+
+    def runPool(positions, poolWorkers): #returns the positions that were lost to a crashed worker
+        crashed = []
+        with cf.ProcessPoolExecutor(max_workers=poolWorkers, initializer=initWorker, initargs=(specs, params, best)) as pool:
+            futures = {pool.submit(fn, tasks[t]): t for t in positions}
+            for f in cf.as_completed(futures):
+                t = futures[f]
+                try:
+                    results[t] = f.result()
+                except BrokenProcessPool:
+                    crashed.append(t)
+                except Exception as e: #the run itself raised, running it again would not help
+                    print("Run " + str(tasks[t]) + " failed: " + repr(e))
+                    failed.append(t)
+        return sorted(crashed)
+
+    for t in runPool(list(range(len(tasks))), max(1, min(workers, len(tasks)))):
+        if len(runPool([t], 1)) > 0:
+            print("Run " + str(tasks[t]) + " crashed its worker")
+            failed.append(t)
+    return results, sorted(failed)
+
+def runDBScanSweep(workers = None, plot = True): #the DBSCAN parameter grid over a pool, written to the same files as cluster_dbscan
+    dataset = np.ascontiguousarray(scio.loadmat(cluster_dbscan.FILENAME)["Points"], dtype=np.float64)
+    shm, spec = shareArray(dataset)
+    try:
+        tasks = [(pts, eps, plot) for pts in cluster_dbscan.MINPTS_PARAMS for eps in cluster_dbscan.DIST_PARAMS]
+        params = {"epsilons": cluster_dbscan.DIST_PARAMS, "minpoints": cluster_dbscan.MINPTS_PARAMS}
+        results, failed = runTasks(dbscanTask, tasks, {"coords": spec}, params, workers)
+    finally:
+        shm.close()
+        shm.unlink()
+    res = {(t[0], t[1]): ("failed", "failed") if r is None else r for t, r in zip(tasks, results)}
+    return cluster_dbscan.writeSweepResults(res, cluster_dbscan.MINPTS_PARAMS, cluster_dbscan.DIST_PARAMS)
+
+def runGMMRounds(workers = None, rounds = None, k = 2, plot = True): #the EM-GMM rounds over a pool, written to the same file as cluster_emgmm
+    rounds = cluster_emgmm.ROUNDS if rounds is None else rounds
+    dataset = scio.loadmat(cluster_emgmm.FILENAME)["Points"]
+    coordsShm, coordsSpec = shareArray(np.ascontiguousarray(dataset[:, :2], dtype=np.float64))
+    truthShm, truthSpec = shareArray(np.ascontiguousarray(dataset[:, 2]))
+    try:
+        tasks = [(i, SEED + i, k, plot) for i in range(rounds)]
+        results, failed = runTasks(gmmTask, tasks, {"coords": coordsSpec, "truth": truthSpec}, {}, workers)
+    finally:
+        for shm in (coordsShm, truthShm):
+            shm.close()
+            shm.unlink()
+    avg_acc = ["failed" if r is None else r for r in results] #rounds keep their position, failed ones are left out of the average
+    if len(failed) < len(avg_acc):
+        cluster_emgmm.writeAccuracies(avg_acc)
+    return avg_acc
+
+#race EM-GMM restarts over a pool - restarts falling behind the best log-likelihood are stopped early and the
+#best of the rest is picked. Returns a GMM with the best parameters (its labels written to its points) and
+#the (how it ended, log-likelihood, parameters) of every restart, None for a failed one
+def runGMMRestarts(workers = None, restarts = None, k = 2, mode = None):
+    restarts = RESTARTS if restarts is None else restarts
+    coords = np.ascontiguousarray(scio.loadmat(cluster_emgmm.FILENAME)["Points"][:, :2], dtype=np.float64)
+    shm, spec = shareArray(coords)
+    best = multiprocessing.Value("d", float("-inf")) #shared by all workers through the pool initializer
+    try:
+        tasks = [(i, SEED + i, k, mode) for i in range(restarts)]
+        results, failed = runTasks(gmmRestartTask, tasks, {"coords": spec}, {}, workers, best)
+    finally:
+        shm.close()
+        shm.unlink()
+    finished = [r for r in results if r is not None and r[0] != "stopped"]
+    if len(finished) == 0:
+        finished = [r for r in results if r is not None]
+    if len(finished) == 0:
+        raise RuntimeError("all " + str(len(tasks)) + " EM-GMM restarts failed: " + ", ".join(str(tasks[t]) for t in failed))
+    gmm = cluster_emgmm.GMM(PointSet(coords, undefined = -1), k, mode)
+    gmm.setParameters(max(finished, key=lambda r: r[1])[2])
+    gmm.assignLabels()
+    return gmm, results
+
+if __name__ == "__main__":
+    print(runDBScanSweep()) #show coefficients
+    print(runGMMRounds()) #show accuracy of each round
+    gmm, restarts = runGMMRestarts()
+    print("Best of " + str(len(restarts)) + " restarts: log-likelihood " + str(gmm.loglik) + ", "
+        + str(sum(1 for r in restarts if r is not None and r[0] == "stopped")) + " stopped early")
+    gmm.showResult("Best of " + str(len(restarts)) + " restarts")
@@ -1,73 +1,128 @@
-from collections import defaultdict
-import itertools
-
-
-class Model: #Helper class to retrieve transactions from database and maintain single item count
-    FILENAME = "freq_items_dataset.txt" #file with transactions
-    def __init__(self): #load transactions from file into an array 
-        self.items = set() #set of unique single items in db
-        self.itemCountMap = defaultdict(lambda: 0) #dictionary to maintain count of all single items
-        self.transactions = []
-        with open(Model.FILENAME, "r") as fl:
-            content = fl.read().split("\n")
-            for row in content: #for each transaction
-                temp = [r for r in row.split(" ") if r != ''] #split to get each item in given transaction
-                for i in temp: #for each item
-                    self.items.add(i) #add item to set of items (note that since we use python's in built set, duplicates are removed)
-                    self.itemCountMap[i] += 1 #increment item count
-                self.transactions.append(temp)
-        self.items = list(self.items)
-    
-    def getAllTransactions(self): #return all transactions
-        return self.transactions
-    def getAllItems(self): #return all unique items in transactions
-        return self.items
-    def getSingleItemCount(self, name): #get support count for single item 
-        return self.itemCountMap[name]
+from multiprocessing import Pool
+import os
+import numpy as np
+from transaction_store import TransactionStore, VerticalIndex, BATCH_SIZE
 
 MINSUP = 1000 # minsup parameter 
-db = Model()
-
-def getKSubset(items, k): #get all k sized subsets of items (given in parameter items)
-    return map(set, itertools.combinations(items, k))
+WORKERS = os.cpu_count() or 1 #number of worker processes, more than 1 mines partitions of the db in parallel (SON)
 
-def getSupportCount(items, transactions): # get support count for given itemset in transactions
-    if(len(items) == 1): #if itemset has only 1 item then use given function in Model class to get support
-        (tmpel,) = items
-        return db.getSingleItemCount(tmpel)
-    else: #otherwise go through all transactions to calculate support for itemset
-        cnt = 0
-        for i, t in enumerate(transactions):
-            if items.issubset(t): # if itemset is subset of transaction then increment support 
-                cnt += 1 
-        return cnt
-
-#get pruned itemsets given transactions, unique items in those transactions and maximum width (i.e. how large the generated itemsets should be)
-def getPrunedItemsets(items, transactions, width): 
-    #make items and each transaction a set, to perform subset operations
-    items = set(items) 
-    transactions = [set(t) for t in transactions]
+def aprioriGen(prevLevel): #generate candidate k-itemsets from frequent (k-1)-itemsets (each a sorted tuple)
+    prevSet = set(prevLevel) #hash set of frequent (k-1)-itemsets for the subset pruning step
+    prevLevel = sorted(prevLevel) #sorting puts itemsets sharing a (k-2)-prefix next to each other
+    candidates = []
+    for i, a in enumerate(prevLevel):
+        for j in range(i+1, len(prevLevel)):
+            b = prevLevel[j]
+            if a[:-1] != b[:-1]: #sorted order means no later itemset shares a's prefix either
+                break
+            cand = a + (b[-1],) #join step - a and b only differ in their last item and a[-1] < b[-1]
+            #prune step - every (k-1)-subset of a frequent itemset is frequent, so drop the candidate if one is not
+            #(the subsets without cand[-1] and cand[-2] are a and b themselves so they are skipped)
+            if all(cand[:m] + cand[m+1:] in prevSet for m in range(len(cand)-2)):
+                candidates.append(cand)
+    return candidates
 
+#get pruned itemsets (tuples of item ids with their support count) from the vertical index of the transactions
+#width caps how large the generated itemsets can get (None = keep going until no candidates remain)
+#minsup defaults to MINSUP, budget (optional) is told how many bytes of cached level bitmaps are held
+def getPrunedItemsets(index, width = None, minsup = None, budget = None): 
+    minsup = MINSUP if minsup is None else minsup
     finalsubsets = [] #store all pruned itemsets here
 
-    for k in range(1,width+1): #for all possible widths from 1 to (width)
-        subset = getKSubset(items, k) # get all k sized subsets from items
-        
-        #generate support count for each generated itemset, store as tuple with itemset in list
-        subset = [(s, getSupportCount(s, transactions)) for s in subset] 
-        subset = [t for t in subset if t[1] >= MINSUP] #pruning step - if support count less than minimum support then get rid of that itemset
-        if(len(subset) == 0): #if no itemsets left after pruning then continue
-            continue
-        for sub in subset: #append remaining subsets to result 
+    #level 1 - single items, support is the popcount of each item's bitmap
+    level = [((i,), index.getSupportCount((i,))) for i in sorted(index.getItems())]
+    level = [t for t in level if t[1] >= minsup] #pruning step - if support count less than minimum support then get rid of that itemset
+    levelBitmaps = {} #bitmaps of the frequent itemsets of the current level, reused as prefixes for the next one
+    k = 1
+    while(len(level) > 0 and (width is None or k <= width)): #until no frequent itemsets are left at this level
+        for sub in level: #append remaining itemsets to result 
             finalsubsets.append(sub)
-        #from remaining subsets, get all unique single items, for next iteration
-        subset = [t[0] for t in subset]
-        items = set.union(*subset)
+        k += 1
+        candidates = aprioriGen([t[0] for t in level]) #build next level only from frequent itemsets of this level
+        #only keep cached bitmaps that are a prefix of some candidate
+        prefixes = set(c[:-1] for c in candidates)
+        levelBitmaps = {p: bm for p, bm in levelBitmaps.items() if p in prefixes}
+        if budget is not None: #counting a batch of candidates next to the cached prefixes
+            budget.set("levelBitmaps", (len(levelBitmaps) + min(len(candidates), BATCH_SIZE)) * index.bitmaps.shape[1])
+        #support count of each candidate is its prefix bitmap ANDed with its last item's bitmap
+        #only frequent candidates keep their bitmap, they are the prefixes of the next level
+        counts, levelBitmaps = index.countLevel(candidates, levelBitmaps, lambda c, cnt: cnt >= minsup)
+        level = [(c, counts[ci]) for ci, c in enumerate(candidates) if counts[ci] >= minsup] #pruning step
+        if budget is not None:
+            budget.set("levelBitmaps", len(levelBitmaps) * index.bitmaps.shape[1])
     return finalsubsets
 
-print("")
-print("There are " + str(len(db.getAllItems())) + "items in db")
-results = getPrunedItemsets(db.getAllItems(), db.getAllTransactions(), 6)
-#write results to file 
-with open("aprout.txt", "w+") as fl: #write results to file
-    fl.write("\n".join([",".join(r) for r in results]))
+#Partitioned (SON) mining - every worker memory maps the store's binary cache once and gets only
+#(start, end) transaction ranges, so the transactions themselves are never pickled between processes
+workerStore = None #store opened by each worker process
+
+def initWorker(filename): #pool initializer - memory map the cached store in the worker
+    global workerStore
+    workerStore = TransactionStore(filename)
+
+def mineLocalPartition(task): #phase 1 - itemsets frequent within transactions [start, end) at the scaled down threshold
+    start, end, minsup = task
+    offsets = workerStore.offsets[start:end+1]
+    local = np.bincount(workerStore.items[offsets[0]:offsets[-1]], minlength=len(workerStore.names))
+    index = VerticalIndex(offsets, workerStore.items, np.nonzero(local >= minsup)[0])
+    return [r[0] for r in getPrunedItemsets(index, minsup = minsup)]
+
+#exact support of every candidate (sorted tuples of any length) in the index, aligned with candidates
+#budget (optional) is told how many bytes of cached level bitmaps are held
+def countCandidates(index, candidates, budget = None):
+    counts = [0] * len(candidates)
+    byLength = {} #candidates are counted level by level so each level reuses the previous level's bitmaps as prefixes
+    for ci, c in enumerate(candidates):
+        byLength.setdefault(len(c), []).append(ci)
+    prefixes = set(c[:-1] for c in candidates) #only bitmaps of itemsets that are a prefix of another candidate are kept
+    prevBitmaps = {}
+    for k in sorted(byLength):
+        level = [candidates[ci] for ci in byLength[k]]
+        if k == 1:
+            levelCounts = [index.getSupportCount(c) for c in level]
+        else:
+            if budget is not None: #counting a batch of candidates next to the cached prefixes
+                budget.set("levelBitmaps", (len(prevBitmaps) + min(len(level), BATCH_SIZE)) * index.bitmaps.shape[1])
+            levelCounts, prevBitmaps = index.countLevel(level, prevBitmaps, lambda c, cnt: c in prefixes)
+            if budget is not None:
+                budget.set("levelBitmaps", len(prevBitmaps) * index.bitmaps.shape[1])
+        for ci, cnt in zip(byLength[k], levelCounts):
+            counts[ci] = cnt
+    return counts
+
+def countPartition(task): #phase 2 - exact support of every candidate within transactions [start, end)
+    start, end, candidates = task
+    offsets = workerStore.offsets[start:end+1]
+    index = VerticalIndex(offsets, workerStore.items, set(i for c in candidates for i in c))
+    return countCandidates(index, candidates)
+
+def getPrunedItemsetsParallel(store, workers = None): #SON algorithm over the store's transactions, same result as getPrunedItemsets
+    workers = WORKERS if workers is None else workers
+    n = store.getNumTransactions()
+    bounds = [n * p // workers for p in range(workers + 1)] #one contiguous partition per worker
+    parts = [(bounds[p], bounds[p+1]) for p in range(workers) if bounds[p+1] > bounds[p]]
+    with Pool(processes=workers, initializer=initWorker, initargs=(store.filename,)) as pool:
+        #an itemset frequent in the whole db is frequent in at least one partition at threshold MINSUP * partition size / n
+        #(rounded up, computed in integers so no itemset is lost to float error)
+        local = pool.map(mineLocalPartition, [(s, e, max(1, (MINSUP * (e - s) + n - 1) // n)) for s, e in parts])
+        candidates = sorted(set(c for res in local for c in res), key=lambda c: (len(c), c)) #merge the local results
+        partCounts = pool.map(countPartition, [(s, e, candidates) for s, e in parts])
+    counts = np.sum(partCounts, axis=0) if len(parts) > 0 else []
+    return [(c, int(counts[ci])) for ci, c in enumerate(candidates) if counts[ci] >= MINSUP]
+
+def fwritestring(results, store): #helper function to write (itemset, support count) results, one "item,item,...<TAB>count" line each
+    return "\n".join([",".join(sorted(store.getItemName(i) for i in r[0])) + "\t" + str(r[1]) for r in results])
+
+if __name__ == "__main__":
+    db = TransactionStore()
+    print("")
+    print("There are " + str(len(db.getAllItems())) + "items in db")
+    if WORKERS > 1:
+        results = getPrunedItemsetsParallel(db)
+    else:
+        #only frequent single items can be in a frequent itemset, so only they get a bitmap
+        index = VerticalIndex(db.offsets, db.items, db.getFrequentItemIds(MINSUP))
+        results = getPrunedItemsets(index)
+    #write results to file 
+    with open("aprout.txt", "w+") as fl: #write results to file
+        fl.write(fwritestring(results, db))
@@ -0,0 +1,145 @@
+from fractions import Fraction
+import json
+import math
+import os
+import numpy as np
+from freqitems_apriori import aprioriGen, countCandidates
+from freqitems_streaming import getPrunedItemsetsStreaming, fwritestring
+from transaction_store import VerticalIndex, readTransactionChunks
+
+FILENAME = "freq_items_dataset.txt" #file with transactions, new batches are appended to its end
+STATE_FILE = "freqitems_state.json" #frequent itemsets and support counts of the previous run
+#minimum support as a fraction of all transactions - with a fixed count every itemset seen in a new batch
+#could become frequent, a fraction is what lets most of them be ruled out from the batch alone
+MINSUP_RATIO = 0.01
+CHUNK_BYTES = 64 * 1024 * 1024 #bytes of text read at once when the history has to be scanned
+
+def getMinCount(ratio, n): #support count needed to be frequent among n transactions, in exact arithmetic
+    return max(1, math.ceil(Fraction(str(ratio)) * n))
+
+def getProcessedEnd(filename): #end of the last complete line - a trailing line without newline may still be being written
+    size = os.path.getsize(filename)
+    with open(filename, "rb") as fl:
+        pos = size
+        while pos > 0:
+            start = max(0, pos - 65536)
+            fl.seek(start)
+            data = fl.read(pos - start)
+            nl = data.rfind(b"\n")
+            if nl != -1:
+                return start + nl + 1
+            pos = start
+    return 0
+
+def countLines(filename, end): #number of transactions in bytes [0, end) of a file that ends them all with newlines
+    n = 0
+    with open(filename, "rb") as fl:
+        while fl.tell() < end:
+            n += fl.read(min(CHUNK_BYTES, end - fl.tell())).count(b"\n")
+    return n
+
+def loadState(stateFile): #previous run's results, or None on the first run
+    if not os.path.exists(stateFile):
+        return None
+    with open(stateFile, "r") as fl:
+        state = json.load(fl)
+    state["itemsets"] = {tuple(r[0]): r[1] for r in state["itemsets"]}
+    return state
+
+def saveState(stateFile, state):
+    out = dict(state)
+    out["itemsets"] = [[list(k), v] for k, v in state["itemsets"].items()]
+    with open(stateFile + ".tmp", "w") as fl: #write then rename, so a crash never leaves a half written state
+        json.dump(out, fl)
+    os.replace(stateFile + ".tmp", stateFile)
+
+def countInRange(filename, start, end, candidates): #exact support of candidates (sorted tuples of item strings) in bytes [start, end)
+    ids = {} #only the candidates' items are encoded, every other item is skipped while parsing
+    for c in candidates:
+        for i in c:
+            ids.setdefault(i, len(ids))
+    encoded = [tuple(sorted(ids[i] for i in c)) for c in candidates]
+    counts = np.zeros(len(candidates), dtype=np.int64)
+    for offsets, items, nbytes in readTransactionChunks(filename, CHUNK_BYTES, ids, start = start, end = end):
+        index = VerticalIndex(offsets, items, set(ids.values()))
+        counts += np.asarray(countCandidates(index, encoded), dtype=np.int64)
+    return counts.tolist()
+
+#FUP - update the previous frequent itemsets with the transactions appended since (bytes [state offset, end))
+#level by level, itemsets frequent before only need their count in the new batch added, every other candidate
+#of the level is counted in the batch first and only those that could still reach the new threshold
+#(batch count >= new threshold - old threshold + 1) are counted in the old transactions
+def updateFrequentItemsets(filename, state, end):
+    start = state["offset"]
+    ids = {} #delta item string -> id
+    names = []
+    offsets = [np.zeros(1, dtype=np.int64)] #the whole batch is held in memory as one CSR
+    items = []
+    for o, it, nbytes in readTransactionChunks(filename, CHUNK_BYTES, ids, names, start = start, end = end):
+        offsets.append(o[1:] + sum(len(i) for i in items))
+        items.append(it)
+    offsets = np.concatenate(offsets)
+    deltaN = len(offsets) - 1
+    newN = state["numTransactions"] + deltaN
+    threshold = getMinCount(state["ratio"], newN)
+    deltaBound = threshold - getMinCount(state["ratio"], state["numTransactions"]) + 1
+    old = state["itemsets"]
+    if deltaN > 0:
+        deltaIndex = VerticalIndex(offsets, np.concatenate(items))
+    stats = {"historyScans": 0, "rechecked": 0}
+
+    def countInDelta(candidates):
+        if deltaN == 0:
+            return [0] * len(candidates)
+        encoded = [tuple(sorted(ids.get(i, -1) for i in c)) for c in candidates] #-1 is never indexed, so it counts 0
+        return countCandidates(deltaIndex, encoded)
+
+    results = {}
+    level = sorted(set((i,) for i in names) | set(c for c in old if len(c) == 1))
+    while len(level) > 0:
+        deltaCounts = countInDelta(level)
+        frequent = []
+        recheck = [] #candidates that were not frequent before but might be now
+        for c, dc in zip(level, deltaCounts):
+            if c in old:
+                if old[c] + dc >= threshold:
+                    frequent.append((c, old[c] + dc))
+            elif dc >= deltaBound:
+                recheck.append((c, dc))
+        if len(recheck) > 0 and start > 0: #only these candidates need the old transactions
+            historyCounts = countInRange(filename, 0, start, [r[0] for r in recheck])
+            stats["historyScans"] += 1
+            stats["rechecked"] += len(recheck)
+        else:
+            historyCounts = [0] * len(recheck)
+        for (c, dc), hc in zip(recheck, historyCounts):
+            if hc + dc >= threshold:
+                frequent.append((c, hc + dc))
+        for c, cnt in frequent:
+            results[c] = cnt
+        level = aprioriGen([c for c, cnt in frequent])
+    return {"ratio": state["ratio"], "numTransactions": newN, "offset": end, "itemsets": results}, stats
+
+def runIncremental(filename = FILENAME, stateFile = STATE_FILE, ratio = None): #bring the state file up to date with filename
+    ratio = MINSUP_RATIO if ratio is None else ratio
+    end = getProcessedEnd(filename)
+    state = loadState(stateFile)
+    if state is not None and (state["ratio"] != ratio or state["offset"] > end): #threshold changed or file was rewritten
+        state = None
+    if state is None: #first run - mine everything once, in bounded memory
+        numTransactions = countLines(filename, end)
+        results, numTransactions, peak = getPrunedItemsetsStreaming(filename, getMinCount(ratio, numTransactions), end = end)
+        state = {"ratio": ratio, "numTransactions": numTransactions, "offset": end,
+            "itemsets": {tuple(sorted(r[0])): r[1] for r in results}}
+        stats = {"historyScans": 2, "rechecked": 0}
+    else:
+        state, stats = updateFrequentItemsets(filename, state, end)
+    saveState(stateFile, state)
+    return state, stats
+
+if __name__ == "__main__":
+    state, stats = runIncremental()
+    print(str(state["numTransactions"]) + " transactions, " + str(len(state["itemsets"])) + " frequent itemsets, "
+        + str(stats["historyScans"]) + " scans of older transactions for " + str(stats["rechecked"]) + " re-checked candidates")
+    with open("incrout.txt", "w+") as fl: #write results to file
+        fl.write(fwritestring(sorted(state["itemsets"].items(), key=lambda r: (len(r[0]), r[0]))))
@@ -1,50 +1,116 @@
-from pymining import itemmining, assocrules
 from collections import defaultdict
-
-class Model: #Helper class to retrieve transactions from database and maintain single item count
-    FILENAME = "freq_items_dataset.txt" #file with transactions
-    def __init__(self): #load transactions from file into an array 
-        self.items = set() #set of unique single items in db
-        self.itemCountMap = defaultdict(lambda: 0) #dictionary to maintain count of all single items
-        self.transactions = []
-        with open(Model.FILENAME, "r") as fl:
-            content = fl.read().split("\n")
-            for row in content: #for each transaction
-                temp = [r for r in row.split(" ") if r != ''] #split to get each item in given transaction
-                for i in temp: #for each item
-                    self.items.add(i) #add item to set of items (note that since we use python's in built set, duplicates are removed)
-                    self.itemCountMap[i] += 1 #increment item count
-                self.transactions.append(temp)
-        self.items = list(self.items)
-    
-    def getAllTransactions(self): #return all transactions
-        return self.transactions
-    def getAllItems(self): #return all unique items in transactions
-        return self.items
-    def getSingleItemCount(self, name): #get support count for single item 
-        return self.itemCountMap[name]
+from array import array
+import itertools
+import numpy as np
+from transaction_store import TransactionStore
 
 MINSUP = 100 #Minimum Support 
-db = Model()
-
 
-def getFrequentItems(transactions): #function to get frequent itemsets based on given transactions
-    relim_input = itemmining.get_relim_input(transactions) #restructure transactions into relim input 
-    item_sets = itemmining.relim(relim_input, MINSUP) #get itemsets with minimum support 
-    results = []
-    for k, v in item_sets.items(): #return results
-        results.append(list(k))
-    return results
 
+class FPTree:
+    """FP-tree with its nodes stored in parallel integer arrays instead of one object per node.
+    Node 0 is the root. Items are integer ids given by frequency rank (0 = most frequent) and
+    every path from the root lists its items in increasing id order."""
+    def __init__(self):
+        self.parent = array('i', [-1]) #parent node of each node
+        self.item = array('i', [-1]) #item id held by each node
+        self.count = array('q', [0]) #count of transactions passing through each node
+        self.link = array('i', [-1]) #next node holding the same item (node-link list), -1 terminates
+        self.head = {} #item id -> first node in its node-link list
+        self.support = defaultdict(int) #item id -> total count of that item in the tree
+        self.children = {} #(parent node, item id) -> child node, only needed while inserting
+    def insert(self, path, cnt): #insert a path of item ids (increasing order) that occurs cnt times
+        node = 0
+        for it in path:
+            child = self.children.get((node, it))
+            if child is None: #no child for this item yet, so append a new node to the arrays
+                child = len(self.item)
+                self.parent.append(node)
+                self.item.append(it)
+                self.count.append(0)
+                self.link.append(self.head.get(it, -1)) #push the node onto the item's node-link list
+                self.head[it] = child
+                self.children[(node, it)] = child
+            self.count[child] += cnt
+            self.support[it] += cnt
+            node = child
+    def isSinglePath(self): #every node was appended as the child of the node before it
+        return all(self.parent[n] == n-1 for n in range(1, len(self.parent)))
+    def prefixPaths(self, it): #conditional pattern base of an item - (path from root, count) for each node holding it
+        node = self.head.get(it, -1)
+        while node != -1:
+            path = []
+            p = self.parent[node]
+            while p > 0: #walk up to (but not including) the root
+                path.append(self.item[p])
+                p = self.parent[p]
+            path.reverse()
+            yield path, self.count[node]
+            node = self.link[node]
 
-results = getFrequentItems(db.getAllTransactions())
+def buildFPTree(weightedPaths, minsup): #build a tree from (path, count) pairs keeping only items with count >= minsup
+    itemCount = defaultdict(int)
+    for path, cnt in weightedPaths:
+        for it in path:
+            itemCount[it] += cnt
+    merged = defaultdict(int) #paths that are identical once infrequent items are dropped are inserted once
+    for path, cnt in weightedPaths:
+        path = tuple(it for it in path if itemCount[it] >= minsup) #drop infrequent items, order is kept
+        if len(path) > 0:
+            merged[path] += cnt
+    tree = FPTree()
+    for path, cnt in merged.items():
+        tree.insert(path, cnt)
+    tree.children = None #lookup table is no longer needed once the tree is built
+    return tree
 
-def fwritestring(lst): #helper function to write list of lists to file
-    s = "\n".join([",".join([li for li in l]) for l in lst])
-    return s
+def fpGrowth(tree, suffix, minsup, results): #mine all frequent itemsets of tree, each extended with suffix
+    if tree.isSinglePath(): #every combination of the path's nodes is frequent, its support is the count of its deepest node
+        nodes = range(1, len(tree.item))
+        for k in range(1, len(nodes)+1):
+            for combo in itertools.combinations(nodes, k):
+                results.append((suffix + tuple(tree.item[n] for n in combo), tree.count[combo[-1]]))
+        return
+    for it in sorted(tree.head, reverse=True): #least frequent item first
+        sup = tree.support[it]
+        if sup < minsup:
+            continue
+        newSuffix = suffix + (it,)
+        results.append((newSuffix, sup))
+        condTree = buildFPTree(list(tree.prefixPaths(it)), minsup) #conditional FP-tree of newSuffix
+        if len(condTree.item) > 1:
+            fpGrowth(condTree, newSuffix, minsup, results)
 
-with open("relimout.txt", "w+") as fl:
-    fl.write(fwritestring(results))
+def getFrequentItems(store): #function to get frequent itemsets (and their support counts) from the transaction store
+    itemCount = np.asarray(store.itemCounts)
+    #integer encode frequent items ordered by decreasing frequency, so common prefixes share nodes
+    ranked = sorted(store.getFrequentItemIds(MINSUP), key=lambda i: (-itemCount[i], store.getItemName(i)))
+    rank = np.full(len(itemCount), -1, dtype=np.int64) #store item id -> tree item id, -1 if infrequent
+    rank[ranked] = np.arange(len(ranked))
+    #encode every transaction as its sorted frequent tree item ids - sort all occurrences by (transaction, rank) at once
+    tids = np.repeat(np.arange(store.getNumTransactions()), np.diff(store.offsets))
+    ranks = rank[store.items]
+    keep = ranks >= 0
+    tids, ranks = tids[keep], ranks[keep]
+    order = np.lexsort((ranks, tids))
+    ranks = ranks[order].tolist()
+    bounds = np.searchsorted(tids[order], np.arange(store.getNumTransactions() + 1)).tolist()
+    encoded = [(ranks[bounds[t]:bounds[t+1]], 1) for t in range(store.getNumTransactions())]
+    tree = buildFPTree(encoded, MINSUP)
+    mined = []
+    fpGrowth(tree, (), MINSUP, mined)
+    results = {} #frozenset of item names -> support count
+    for ids, sup in mined:
+        results[frozenset(store.getItemName(ranked[i]) for i in ids)] = sup
+    return results
 
+def fwritestring(results): #helper function to write itemsets with their support counts, one "item,item,...<TAB>count" line each
+    s = "\n".join([",".join(sorted(k)) + "\t" + str(v) for k, v in results.items()])
+    return s
 
-print("FINISHED")
\ No newline at end of file
+if __name__ == "__main__":
+    db = TransactionStore()
+    results = getFrequentItems(db)
+    with open("relimout.txt", "w+") as fl:
+        fl.write(fwritestring(results))
+    print("FINISHED")
@@ -0,0 +1,59 @@
+from freqitems_apriori import aprioriGen
+from transaction_store import TransactionStore
+
+FREQ_FILE = "relimout.txt" #frequent itemsets with support counts ("item,item,...<TAB>count" per line)
+RULES_FILE = "rulesout.txt"
+MINCONF = 0.5 #minimum confidence
+MINLIFT = 1.0 #minimum lift
+
+def loadSupports(filename): #support count of every frequent itemset, keyed by its sorted tuple of items
+    supports = {}
+    with open(filename, "r") as fl:
+        for line in fl:
+            fields = line.rstrip("\n").split("\t")
+            if len(fields) < 2 or fields[0] == '':
+                continue
+            supports[tuple(sorted(fi for fi in fields[0].split(",") if fi != ''))] = int(fields[1])
+    return supports
+
+#generate rules antecedent => consequent (both sorted tuples) with support count, confidence and lift
+#supports must hold every frequent itemset (all subsets of a frequent itemset are frequent) so that every
+#antecedent and consequent support is a hash lookup. Consequents of each itemset grow one item at a time and
+#only from consequents that passed MINCONF - moving an item from the antecedent to the consequent can only
+#lower the confidence, so the extensions of a failed consequent are never generated
+def generateRules(supports, numTransactions, minconf = None, minlift = None):
+    minconf = MINCONF if minconf is None else minconf
+    minlift = MINLIFT if minlift is None else minlift
+    for itemset, sup in supports.items():
+        if len(itemset) < 2:
+            continue
+        consequents = [(i,) for i in itemset]
+        while len(consequents) > 0 and len(consequents[0]) < len(itemset):
+            passed = []
+            for consequent in consequents:
+                members = set(consequent)
+                antecedent = tuple(i for i in itemset if i not in members)
+                if antecedent not in supports or consequent not in supports:
+                    raise ValueError("support of a subset of " + ",".join(itemset) + " is missing - rules need all frequent itemsets")
+                conf = sup / supports[antecedent]
+                if conf < minconf:
+                    continue
+                passed.append(consequent)
+                lift = conf * numTransactions / supports[consequent]
+                if lift >= minlift:
+                    yield antecedent, consequent, sup, conf, lift
+            consequents = aprioriGen(passed)
+
+def writeRules(rules, filename): #stream rules to a file one line at a time, returns the number written
+    cnt = 0
+    with open(filename, "w+") as fl:
+        for antecedent, consequent, sup, conf, lift in rules:
+            fl.write(",".join(antecedent) + "=>" + ",".join(consequent) + "\t" + str(sup) + "\t" + str(conf) + "\t" + str(lift) + "\n")
+            cnt += 1
+    return cnt
+
+if __name__ == "__main__":
+    db = TransactionStore() #only the number of transactions is needed, for lift
+    supports = loadSupports(FREQ_FILE)
+    cnt = writeRules(generateRules(supports, db.getNumTransactions()), RULES_FILE)
+    print("Wrote " + str(cnt) + " rules")
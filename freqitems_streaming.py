@@ -0,0 +1,96 @@
+import math
+import os
+import sys
+import numpy as np
+from freqitems_apriori import getPrunedItemsets, countCandidates
+from transaction_store import VerticalIndex, readTransactionChunks
+
+FILENAME = "freq_items_dataset.txt" #file with transactions
+MINSUP = 1000 # minsup parameter
+MAX_MEMORY = 512 * 1024 * 1024 #peak memory (bytes) the mining data may hold at once
+CHUNK_BYTES = MAX_MEMORY // 16 #bytes of text read per chunk
+ITEM_BYTES = 120 #estimated bytes held per distinct item in the item dictionary (string, dict entry, list slot)
+CANDIDATE_BYTES = 120 #estimated bytes held per candidate besides its tuple (dict/list slots, count)
+
+class MemoryBudget:
+    """Keeps track of the bytes held by each named part of a streaming run (chunk text, CSR arrays, bitmaps,
+    candidate counters...) and raises MemoryError as soon as their total goes over the limit, before the
+    part that would overflow it is built"""
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = {} #part name -> bytes
+        self.peak = 0 #largest total seen so far
+    def set(self, name, nbytes): #set the bytes held by one part
+        self.used[name] = nbytes
+        total = self.getTotal()
+        self.peak = max(self.peak, total)
+        if total > self.limit:
+            raise MemoryError("streaming run needs " + str(total) + " bytes (" + ", ".join(k + "=" + str(v) for k, v in self.used.items())
+                + ") but MAX_MEMORY is " + str(self.limit) + " - raise MAX_MEMORY or MINSUP, or lower CHUNK_BYTES")
+    def release(self, name): #part is no longer held
+        self.used.pop(name, None)
+    def getTotal(self):
+        return sum(self.used.values())
+
+def candidateBytes(candidates): #estimated bytes held by a collection of candidate tuples and their counters
+    return sum(sys.getsizeof(c) for c in candidates) + len(candidates) * CANDIDATE_BYTES
+
+#SON over chunks of the file, so exactly two passes are made whatever the file size
+#pass 1 - mine every chunk at MINSUP scaled by the chunk's share of the file's bytes, the union of the local
+#results are the only candidates (an itemset below the scaled threshold in every chunk is below MINSUP overall)
+#pass 2 - count the candidates exactly, one chunk at a time
+#only bytes [0, end) of the file are read when end is given
+#returns ((item, item, ...), support count) results, the number of transactions read and the peak accounted memory
+def getPrunedItemsetsStreaming(filename = FILENAME, minsup = None, maxMemory = None, chunkBytes = None, end = None):
+    minsup = MINSUP if minsup is None else minsup
+    budget = MemoryBudget(MAX_MEMORY if maxMemory is None else maxMemory)
+    chunkBytes = CHUNK_BYTES if chunkBytes is None else chunkBytes
+    fileBytes = os.path.getsize(filename) if end is None else end
+    ids = {} #item string -> item id
+    names = [] #item id -> item string
+
+    candidates = set() #pass 1
+    numTransactions = 0
+    for offsets, items, nbytes in readTransactionChunks(filename, chunkBytes, ids, names, end = end):
+        budget.set("items", len(names) * ITEM_BYTES)
+        budget.set("chunk", nbytes + offsets.nbytes + items.nbytes)
+        numTransactions += len(offsets) - 1
+        localMinsup = max(1, (minsup * nbytes + fileBytes - 1) // fileBytes) #ceil(minsup * nbytes / fileBytes)
+        local = np.bincount(items, minlength=len(names))
+        index = VerticalIndex(offsets, items, np.nonzero(local >= localMinsup)[0])
+        budget.set("index", index.bitmaps.nbytes)
+        for r in getPrunedItemsets(index, minsup = localMinsup, budget = budget):
+            candidates.add(r[0])
+        budget.set("candidates", candidateBytes(candidates))
+        del index
+        budget.release("index")
+        budget.release("levelBitmaps")
+    budget.release("chunk")
+
+    #pass 2 - only candidate items are of interest, so the item dictionary is cut down to them and stops growing
+    candidates = sorted(candidates, key=lambda c: (len(c), c))
+    candidateItems = set(i for c in candidates for i in c)
+    ids = {names[i]: i for i in candidateItems}
+    names = [names[i] if i in candidateItems else None for i in range(len(names))]
+    budget.set("items", len(ids) * ITEM_BYTES)
+    counts = np.zeros(len(candidates), dtype=np.int64) #one counter per candidate
+    for offsets, items, nbytes in readTransactionChunks(filename, chunkBytes, ids, end = end):
+        budget.set("chunk", nbytes + offsets.nbytes + items.nbytes)
+        index = VerticalIndex(offsets, items, candidateItems)
+        budget.set("index", index.bitmaps.nbytes)
+        counts += np.asarray(countCandidates(index, candidates, budget), dtype=np.int64)
+        del index
+        budget.release("index")
+        budget.release("levelBitmaps")
+    results = [(tuple(names[i] for i in c), int(counts[ci])) for ci, c in enumerate(candidates) if counts[ci] >= minsup]
+    return results, numTransactions, budget.peak
+
+def fwritestring(results): #helper function to write (itemset, support count) results, one "item,item,...<TAB>count" line each
+    return "\n".join([",".join(sorted(r[0])) + "\t" + str(r[1]) for r in results])
+
+if __name__ == "__main__":
+    results, numTransactions, peak = getPrunedItemsetsStreaming()
+    print("Read " + str(numTransactions) + " transactions in chunks of " + str(CHUNK_BYTES) + " bytes, peak accounted memory "
+        + str(math.ceil(peak / (1024 * 1024))) + "MB")
+    with open("streamout.txt", "w+") as fl: #write results to file
+        fl.write(fwritestring(results))
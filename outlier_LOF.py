@@ -1,10 +1,14 @@
 #!usr/bin/python3 
+import heapq
 import math
 import pandas as pd
 import numpy as np
+from scipy.spatial import cKDTree
 
 
 FILENAME = "clickstreamevent.csv"
+TOP_BATCH = 16 #points scored at a time by the top-n search (getTopLOF)
+BUFFER_SIZE = 32 #points a TreeIndex takes in before they are built into a KD-tree
 
 def readData(): #function to read data from csv
     data = pd.read_csv(FILENAME)
@@ -45,60 +49,593 @@ class Point: #Point class represents a 5d point
             # and current point's local reachability density 
         return (sum_reachability) / (len(self.knn_group)) #return average of all ratios
 
+#k distance neighborhoods from the points ranked by distance to each point (CSR, closest first, ties in dataset order,
+#other users only) as far as the (k+1)th and the points right after it at (math.isclose) the same distance - ranked
+#for a larger k reach far enough for any smaller one. As populateKnn always did it: the k closest points, then the
+#points after the (k+1)th closest that are at the same distance as the (k+1)th (which itself is left out).
+#Returns indptr, neighbors, neighborDists for k
+def truncateNeighborhoods(indptr, ranked, rankedDists, k):
+    sizes = np.diff(indptr)
+    if np.any(sizes < k + 1):
+        raise ValueError("ranked points are shorter than k+1=" + str(k + 1))
+    pos = np.arange(len(ranked)) - np.repeat(indptr[:-1], sizes) #position of each entry in its ranking
+    prevdist = np.repeat(rankedDists[indptr[:-1] + k], sizes) #distance to the (k+1)th
+    close = np.abs(rankedDists - prevdist) <= 1e-9 * np.maximum(np.abs(rankedDists), np.abs(prevdist)) #math.isclose
+    stop = np.cumsum((pos > k) & ~close) #entries are kept up to the first one that is past k+1 and not tied
+    keep = (stop == np.repeat(stop[indptr[:-1]], sizes)) & (pos != k)
+    newptr = np.zeros_like(indptr)
+    newptr[1:] = np.cumsum(np.add.reduceat(keep.astype(np.int64), indptr[:-1]))
+    return newptr, ranked[keep], rankedDists[keep]
+
+def selectNeighborhood(ranked, rankedDists, k): #k distance neighborhood and the distances to it from one point's ranked points
+    return truncateNeighborhoods(np.array([0, len(ranked)], dtype=np.int64), ranked, rankedDists, k)[1:]
+
+def sumNeighborhoods(values, indptr): #sum of the values of each neighborhood (CSR), added one at a time in order as Point does
+    sizes = np.diff(indptr)
+    order = np.argsort(-sizes, kind="stable") #rows still going at each position are a prefix of this order
+    going = np.cumsum(np.bincount(sizes, minlength=1)[::-1])[::-1] #rows at least j long, for each j
+    sums = np.zeros(len(sizes))
+    for j in range(1, len(going)):
+        rows = order[:going[j]]
+        sums[rows] += values[indptr[rows] + j - 1]
+    return sums
+
+#k-distance, local reachability density and lof of every point from its neighborhood (CSR, closest first), each
+#computed once (Point.calculateLOF gives the same lof for a single point). A point with reach distance 0 to all its
+#neighbors (duplicates) has an infinite lrd - where Point.calculateLOF divides by zero, a neighbor with an infinite lrd
+#counts as exactly as dense as a point with an infinite lrd (ratio 1), so a point with only duplicates around it has
+#lof 1 and one whose neighbors are duplicates of each other has lof inf
+def getLOFScores(indptr, neighbors, neighborDists):
+    sizes = np.diff(indptr) #neighborhoods are at least k long, ties make them longer
+    owner = np.repeat(np.arange(len(sizes)), sizes) #point each neighbor entry belongs to
+    kdist = neighborDists[indptr[1:] - 1] #distance to the last (kth) neighbor
+    reach = np.maximum(kdist[neighbors], neighborDists) #reachDist of each point to each of its neighbors
+    with np.errstate(divide="ignore", invalid="ignore"):
+        lrd = sizes / sumNeighborhoods(reach, indptr) #inverse of average reachDist
+        ratio = lrd[neighbors] / lrd[owner]
+    ratio[np.isinf(lrd[neighbors]) & np.isinf(lrd[owner])] = 1.0 #inf/inf, duplicates are as dense as each other
+    lof = sumNeighborhoods(ratio, indptr) / sizes #average ratio of neighbor lrd to own lrd
+    return kdist, lrd, lof
+
+def getTopOutliers(userids, lof, n): #top n (user id, lof score) in descending order by lof score, nan scores last
+    lof_list = [(u, float(s)) for u, s in zip(userids, lof)]
+    lof_list.sort(key=lambda x: (not math.isnan(x[1]), x[1]), reverse=True)
+    return lof_list[:n]
+
 class LOF: 
     """LOF class created for better organization - maintains list of all points and 
-    populates their k nearest neighborhood"""
+    populates their k nearest neighborhood.
+    Neighbors come from a KD-tree over all points (p=2 for 'E', p=1 for 'M'), queried for every point at once.
+    The tree only proposes candidates - their distances are recomputed exactly as Point.distance does and
+    sorted by (distance, position in dataset), so the neighborhoods are the ones a full sort gives.
+    populateAllKnn keeps all neighborhoods as flat arrays (CSR - the neighborhood of point i is
+    neighbors[indptr[i]:indptr[i+1]], closest first, with their distances in neighborDists), and computeLOF
+    works out the k-distance, lrd and lof of every point from them exactly once. The ranked points the
+    neighborhoods were cut from are kept as well, getLOFScores gives the scores for any smaller k from them.
+    getTopLOF finds the top n outliers without scoring every point (bound based, as Jin et al.'s top-n local
+    outliers) - bounds on k-distance, lrd and lof of every point come from one batched tree query, and only
+    points whose lof upper bound can reach the nth best score get their neighborhoods searched and scored"""
     def __init__(self, rawdata, k, dist_metric):
         self.points = []
         for r in rawdata: #add points to list
             self.points.append(Point(r, dist_metric))
         self.dist_metric = dist_metric # set distance metric
         self.k = k # set k
-    def populateKnn(self, pointIndex): #function to get all points in kth neighborhood of a point (referenced by index of point, pointIndex)
-        ref_point = self.points[pointIndex] #current point
-        relative_ref = self.points 
-        relative_ref = sorted(relative_ref, key=lambda p1: ref_point.distance(p1)) #sort all points by distance to current point
-        relative_ref = [r for r in relative_ref if r.userid != self.points[pointIndex].userid] #remove current point from that list 
-        self.points[pointIndex].knn_group = relative_ref[:self.k] #get the k closest points 
-        prevdist = relative_ref[self.k].distance(ref_point) #get the distance to kth closest point 
-        #loop to handle cases where there may be points having distance to current point that is same as distance between current point
-        # and kth closest point
-        for i in range(self.k+1, len(relative_ref)): #for every point after kth point
-            if math.isclose(relative_ref[i].distance(ref_point), prevdist) == True: #if it is same as distance to kth point
-                self.points[pointIndex].knn_group.append(relative_ref[i]) #then add it to the list 
-            else: #otherwise stop
-                break
+        self.coords = np.asarray([p.data for p in self.points], dtype=np.float64).reshape(len(self.points), -1) #one row per point
+        self.users = np.unique([p.userid for p in self.points], return_inverse=True)[1] #userid of every point as an integer
+        self.tree = cKDTree(self.coords) #built once, shared by all queries
+        self.closest = None #(distances, indices) of the closest points to every point, set by queryClosest
+        self.rankedPtr = None #ranked points of all points (CSR), set by populateAllKnn
+        self.ranked = None
+        self.rankedDists = None
+        self.indptr = None #neighborhoods of all points (CSR), set by populateAllKnn
+        self.neighbors = None
+        self.neighborDists = None
+        self.kdist = None #per point arrays, set by computeLOF
+        self.lrd = None
+        self.lof = None
+    def getDistances(self, pointIndex, idx): #distances between a point and the points idx, summed in the same order as Point.distance
+        diff = self.coords[idx] - self.coords[pointIndex]
+        r = np.zeros(len(diff))
+        for c in range(diff.shape[1]): #one attribute at a time, sum() may add them up in another order
+            r += diff[:, c] * diff[:, c] if self.dist_metric == 'E' else np.abs(diff[:, c]) #** 2 can round differently from math.pow
+        return np.sqrt(r) if self.dist_metric == 'E' else r
+    #points with another userid ranked by distance to a point, from candidates proposed by the tree, as far as
+    #truncateNeighborhoods needs them - the (k+1)th closest and every further point at (math.isclose) the same distance
+    #returns the ranked points (indices of points, closest first) and the distances to them, or None when there may
+    #be points among them that are not among the candidates
+    def knnFromCandidates(self, pointIndex, candidates):
+        n = len(self.points)
+        complete = len(candidates) >= n #every point is a candidate
+        candidates = candidates[candidates < n] #the tree pads missing neighbors with n
+        dists = self.getDistances(pointIndex, candidates)
+        order = np.lexsort((candidates, dists)) #by distance, ties in dataset order
+        candidates, dists = candidates[order], dists[order]
+        other = self.users[candidates] != self.users[pointIndex] #remove current point (and any other point of its user)
+        if not complete and np.count_nonzero(other) <= self.k + 1:
+            return None
+        candidates, dists = candidates[other], dists[other]
+        if len(candidates) < self.k + 1:
+            raise ValueError("k=" + str(self.k) + " but only " + str(len(candidates)) + " points have another userid than " + self.points[pointIndex].userid)
+        prevdist = dists[self.k] #distance to the (k+1)th closest point
+        end = self.k + 1
+        #handle cases where there may be points having distance to current point that is same as distance between current point
+        # and (k+1)th closest point
+        while end < len(dists) and math.isclose(dists[end], prevdist):
+            end += 1
+        if not complete and (end == len(dists) or dists[-1] <= prevdist * (1 + 2e-9)): #ties might go on past the candidates
+            return None
+        return candidates[:end], dists[:end]
+    def setKnn(self, pointIndex, group): #store a point's k distance neighborhood (indices of points, closest first)
+        self.points[pointIndex].knn_group = [self.points[j] for j in group.tolist()]
         self.points[pointIndex].kthneighbor = self.points[pointIndex].knn_group[-1] #set kth nearest point 
-    def getAllLOF(self, n=5): #function to get all points with lof score
-        lof_list = [] #maintain list of tuples with user id and lof score
-        for i, p in enumerate(self.points): #get kth neighborhood for all points 
-            self.populateKnn(i)
-        for i, p in enumerate(self.points): #for each point calculate lof score
-            lof_list.append((p.userid, p.calculateLOF())) 
-        lof_list.sort(key=lambda x: x[1], reverse=True) #sort in descending order by lof score 
-        return lof_list[:n] #get the top n outliers
+    def queryKnn(self, pointIndex, count = None): #ranked points of a point and the distances to them, asking the tree for more candidates until they are sure to be among them
+        count = self.k + 3 if count is None else count
+        while True:
+            candidates = self.tree.query(self.coords[pointIndex], k=min(count, len(self.points)), p=2 if self.dist_metric == 'E' else 1)[1]
+            found = self.knnFromCandidates(pointIndex, np.atleast_1d(candidates))
+            if found is not None:
+                return found
+            count *= 2
+    def populateKnn(self, pointIndex): #function to get all points in kth neighborhood of a point (referenced by index of point, pointIndex)
+        self.setKnn(pointIndex, selectNeighborhood(*self.queryKnn(pointIndex), self.k)[0])
+    #(distances, indices) of the 2k+6 closest points to every point, one batched tree query made once - twice the k+3
+    #the ranked points need at least, so fewer points are asked again for ties and getLOFBounds covers more of them
+    def queryClosest(self):
+        if self.closest is None:
+            n = len(self.points)
+            dists, idx = self.tree.query(self.coords, k=min(2 * self.k + 6, n), p=2 if self.dist_metric == 'E' else 1)
+            self.closest = dists.reshape(n, -1), idx.reshape(n, -1)
+        return self.closest
+    def findRanked(self, idx): #(ranked points, distances) of each of the points idx, with batched tree queries
+        idx = np.asarray(idx, dtype=np.int64)
+        found = [None] * len(idx)
+        todo = np.arange(len(idx))
+        candidates = self.queryClosest()[1][idx]
+        count = candidates.shape[1]
+        while len(todo) > 0: #points that need more candidates are asked again, together
+            for t, c in zip(todo.tolist(), candidates):
+                found[t] = self.knnFromCandidates(idx[t], c)
+            todo = np.asarray([t for t in todo.tolist() if found[t] is None], dtype=np.int64)
+            count = min(2 * count, len(self.points))
+            if len(todo) > 0:
+                candidates = self.tree.query(self.coords[idx[todo]], k=count, p=2 if self.dist_metric == 'E' else 1)[1].reshape(len(todo), -1)
+        return found
+    def findNeighborhoods(self, idx): #(neighborhood, distances) of each of the points idx
+        found = self.findRanked(idx)
+        ptr = np.zeros(len(found) + 1, dtype=np.int64)
+        ptr[1:] = np.cumsum([len(f[0]) for f in found])
+        ptr, neighbors, dists = truncateNeighborhoods(ptr, np.concatenate([f[0] for f in found] + [np.zeros(0, dtype=np.int64)]).astype(np.int64),
+            np.concatenate([f[1] for f in found] + [np.zeros(0)]), self.k)
+        return [(neighbors[ptr[r]:ptr[r+1]], dists[ptr[r]:ptr[r+1]]) for r in range(len(found))]
+    def populateAllKnn(self): #k distance neighborhoods of all points
+        n = len(self.points)
+        found = self.findRanked(np.arange(n))
+        self.rankedPtr = np.zeros(n + 1, dtype=np.int64)
+        self.rankedPtr[1:] = np.cumsum([len(f[0]) for f in found])
+        self.ranked = np.concatenate([f[0] for f in found]).astype(np.int64)
+        self.rankedDists = np.concatenate([f[1] for f in found])
+        self.indptr, self.neighbors, self.neighborDists = truncateNeighborhoods(self.rankedPtr, self.ranked, self.rankedDists, self.k)
+    def computeLOF(self): #k-distance, lrd and lof of every point for this LOF's k
+        if self.indptr is None:
+            self.populateAllKnn()
+        self.kdist, self.lrd, self.lof = getLOFScores(self.indptr, self.neighbors, self.neighborDists)
+        return self.lof
+    def getLOFScores(self, k): #(kdist, lrd, lof) of every point for any k up to this LOF's k, without searching neighbors again
+        if self.indptr is None:
+            self.populateAllKnn()
+        if k > self.k:
+            raise ValueError("neighborhoods were found for k=" + str(self.k) + ", can't score k=" + str(k))
+        return getLOFScores(*truncateNeighborhoods(self.rankedPtr, self.ranked, self.rankedDists, k))
+    #lower and upper bounds on the lof of every point, from one batched tree query without resolving ties or users.
+    #The k-distance of a point lies between the (k+1)th smallest distance to all points (itself included) and the
+    #(k+1)th smallest to points of other users, and its neighbors are among the points within that upper bound - the
+    #query's own results when they reach past it, a ball query otherwise. Reach distances are bounded by the
+    #k-distance bounds of those points and the distances to the point's k closest, then lrd, then lof (average
+    #neighbor lrd times average reach distance, infinite when a neighbor may have an infinite lrd)
+    def getLOFBounds(self):
+        n = len(self.points)
+        p = 2 if self.dist_metric == 'E' else 1
+        dists, idx = self.queryClosest()
+        count = idx.shape[1]
+        kdistLow = (dists[:, self.k] if self.k < count else np.full(n, np.inf)) * (1 - 1e-9)
+        other = self.users[idx] != self.users[:, None]
+        reached = np.cumsum(other, axis=1) >= self.k + 1
+        kdistUp = np.where(reached.any(axis=1), dists[np.arange(n), reached.argmax(axis=1)], np.inf) * (1 + 3e-9) #ties at the (k+1)th distance are within math.isclose of it
+        closeLow = dists[:, 1:self.k+1].mean(axis=1) * (1 - 1e-9) #average distance to the neighbors is at least that to the k closest others
+        queried = idx < n #the tree pads missing neighbors with n
+        covered = np.any(~queried, axis=1) | (dists[:, -1] > kdistUp) #the query holds every point within the k-distance bound
+        candidate = queried & other & (dists <= kdistUp[:, None])
+        safe = np.where(queried, idx, 0)
+        unbounded = ~np.isfinite(kdistUp)
+        rest = np.flatnonzero(~covered & ~unbounded)
+        balls = self.tree.query_ball_point(self.coords[rest], kdistUp[rest], p=p) #never empty, each holds its own point
+        ballPoints = np.concatenate([np.asarray(b, dtype=np.int64) for b in balls] + [np.zeros(0, dtype=np.int64)])
+        ballStarts = np.concatenate([[0], np.cumsum([len(b) for b in balls])[:-1]]).astype(np.int64)
+        def spread(values, reduce): #reduce values over the points that may be neighbors of each point
+            worst = 0.0 if reduce is np.minimum else np.inf
+            out = reduce.reduce(np.where(candidate, values[safe], np.inf if reduce is np.minimum else -np.inf), axis=1)
+            if len(rest) > 0:
+                out[rest] = reduce.reduceat(values[ballPoints], ballStarts)
+            out[unbounded] = worst
+            return out
+        reachLow = np.maximum(spread(kdistLow, np.minimum), closeLow) #bounds on the average reach distance of each point
+        reachUp = np.maximum(spread(kdistUp, np.maximum), kdistUp)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            lrdLow, lrdUp = 1 / reachUp, 1 / reachLow
+            lofLow = spread(lrdLow, np.minimum) * reachLow * (1 - 1e-9)
+            lofUp = spread(lrdUp, np.maximum) * reachUp * (1 + 1e-9)
+        return np.nan_to_num(lofLow, nan=0.0, posinf=np.inf), np.nan_to_num(lofUp, nan=np.inf, posinf=np.inf)
+    #top n (user id, lof score) - the same list as getAllLOF(n). Points are scored best lof bound first, size at a
+    #time, until no point left can reach the nth best score - the nth best lower bound to start with, then the nth
+    #best score found so far. Once more than half the neighborhoods are searched (ties and duplicates leave the
+    #bounds loose) the rest are searched at once and every point is scored, as getAllLOF does
+    def getTopLOF(self, n=5, size = None):
+        size = TOP_BATCH if size is None else size
+        lofLow, lofUp = self.getLOFBounds()
+        bar = -np.sort(-lofLow)[n-1] if n <= len(lofLow) else -np.inf #n points surely score at least this
+        found = {} #point -> (neighborhood, distances), searched once
+        def ensure(idx): #search the neighborhoods of the points idx not searched yet, returns all their neighbors
+            todo = [i for i in idx if i not in found]
+            if len(todo) > 0:
+                found.update(zip(todo, self.findNeighborhoods(np.asarray(todo, dtype=np.int64))))
+            return set(j for i in idx for j in found[i][0].tolist())
+        scores = {} #point -> exact lof
+        best = [] #heap of the n best scores
+        order = np.argsort(-lofUp, kind="stable")
+        for start in range(0, len(order), size):
+            if 2 * len(found) > len(order): #pruning does not pay off here
+                ensure(range(len(order)))
+                indptr = np.zeros(len(order) + 1, dtype=np.int64)
+                indptr[1:] = np.cumsum([len(found[i][0]) for i in range(len(order))])
+                neighbors = np.concatenate([found[i][0] for i in range(len(order))]).astype(np.int64)
+                lof = getLOFScores(indptr, neighbors, np.concatenate([found[i][1] for i in range(len(order))]))[2]
+                return getTopOutliers([p.userid for p in self.points], lof, n)
+            batch = [i for i in order[start:start+size].tolist() if lofUp[i] >= bar]
+            if len(batch) == 0:
+                break #no point left can reach the top n
+            level1 = set(batch) | ensure(batch) #lrd of these is needed
+            level2 = level1 | ensure(level1) #k-distance of these is needed
+            ensure(level2)
+            rows = list(level2)
+            local = {i: r for r, i in enumerate(rows)}
+            groups = [found[i][0] if i in level1 else np.array([i]) for i in rows] #k-distance is all the other rows are used for
+            dists = [found[i][1] if i in level1 else found[i][1][-1:] for i in rows]
+            indptr = np.zeros(len(rows) + 1, dtype=np.int64)
+            indptr[1:] = np.cumsum([len(g) for g in groups])
+            neighbors = np.asarray([local[j] for g in groups for j in g.tolist()], dtype=np.int64)
+            lof = getLOFScores(indptr, neighbors, np.concatenate(dists))[2] #same per point sums as computeLOF
+            for i in batch:
+                scores[i] = float(lof[local[i]])
+                if len(best) < n:
+                    heapq.heappush(best, scores[i])
+                elif scores[i] > best[0]:
+                    heapq.heapreplace(best, scores[i])
+            if len(best) == n:
+                bar = max(bar, best[0])
+        top = sorted(scores) #in dataset order, so ties keep the order getAllLOF gives them
+        return getTopOutliers([self.points[i].userid for i in top], [scores[i] for i in top], n)
+    def getAllLOF(self, n=5, k = None): #function to get the top n points by lof score (for k, this LOF's k if None)
+        lof = self.computeLOF() if k is None or k == self.k else self.getLOFScores(k)[2]
+        return getTopOutliers([p.userid for p in self.points], lof, n)
 
+#top n outliers for every (k, distance metric) in params -> {(k, metric): [(user id, lof score), ...]}
+#neighbors are searched once per metric, for its largest k, and every smaller k is scored from those
+def getAllLOFParams(rawdata, params, n=5):
+    tables = {}
+    for metric in dict.fromkeys(m for _, m in params): #metrics in order of first appearance
+        ks = sorted(set(k for k, m in params if m == metric))
+        lof = LOF(rawdata, ks[-1], metric)
+        for k in ks:
+            tables[(k, metric)] = lof.getAllLOF(n, k)
+    return {(k, m): tables[(k, m)] for k, m in params} #in the order asked for
 
+class TreeIndex:
+    '''
+    Set of points (ids into an owner's coords) that points can be added to and removed from, searched by
+    KD-trees - a buffer of up to BUFFER_SIZE new points searched by brute force, and KD-trees of
+    doubling sizes (logarithmic method): a full buffer is merged with the trees no larger than it into one
+    new tree, so each point is rebuilt into a tree O(log n) times. Removed points stay in their tree until
+    half of it is removed, then it is rebuilt
+    '''
+    def __init__(self, owner, p):
+        self.owner = owner #holds the coordinates (owner.coords, rows are ids)
+        self.p = p #minkowski p - 2 for euclidian, 1 for manhattan
+        self.buffer = set()
+        self.trees = {} #serial -> [ids, cKDTree, removed count]
+        self.where = {} #id -> serial of the tree it is in, -1 for the buffer
+        self.serial = 0
+    def __len__(self):
+        return len(self.where)
+    def distances(self, x, ids): #distances from x to the points ids
+        diff = self.owner.coords[ids] - x
+        return np.sqrt((diff ** 2).sum(axis=1)) if self.p == 2 else np.abs(diff).sum(axis=1)
+    def build(self, ids): #new tree over ids
+        ids = np.asarray(ids, dtype=np.int64)
+        self.serial += 1
+        self.trees[self.serial] = [ids, cKDTree(self.owner.coords[ids]), 0]
+        for i in ids.tolist():
+            self.where[i] = self.serial
+    def add(self, i):
+        self.where[i] = -1
+        self.buffer.add(i)
+        if len(self.buffer) >= BUFFER_SIZE:
+            ids = list(self.buffer)
+            self.buffer = set()
+            for s in sorted(self.trees, key=lambda s: len(self.trees[s][0])): #merge in trees no larger than what is merged so far
+                if len(self.trees[s][0]) > len(ids):
+                    break
+                ids.extend(j for j in self.trees.pop(s)[0].tolist() if self.where.get(j) == s)
+            self.build(ids)
+    def remove(self, i):
+        s = self.where.pop(i)
+        if s == -1:
+            self.buffer.discard(i)
+            return
+        t = self.trees[s]
+        t[2] += 1
+        if 2 * t[2] >= len(t[0]): #half removed - rebuild from the rest
+            del self.trees[s]
+            rest = [j for j in t[0].tolist() if self.where.get(j) == s]
+            if len(rest) > 0:
+                self.build(rest)
+    def ball(self, x, r): #ids of points within r of x (a few just outside may be included)
+        found = []
+        if len(self.buffer) > 0:
+            ids = np.fromiter(self.buffer, dtype=np.int64, count=len(self.buffer))
+            found = ids[self.distances(x, ids) <= r * (1 + 1e-9)].tolist()
+        for s, (ids, tree, removed) in self.trees.items():
+            found.extend(j for j in ids[tree.query_ball_point(x, r * (1 + 1e-9), p=self.p)].tolist() if self.where.get(j) == s)
+        return found
+    #candidate nearest points of x - the count nearest of each tree and the whole buffer - and a distance every
+    #point that is not a candidate is at least at (inf if all points are candidates)
+    def nearest(self, x, count):
+        found = list(self.buffer)
+        beyond = np.inf
+        for s, (ids, tree, removed) in self.trees.items():
+            dists, idx = tree.query(x, k=min(count, len(ids)), p=self.p)
+            dists, idx = np.atleast_1d(dists), np.atleast_1d(idx)
+            found.extend(j for j in ids[idx].tolist() if self.where.get(j) == s)
+            if count < len(ids):
+                beyond = min(beyond, dists[-1])
+        return found, beyond
 
+class IncrementalLOF:
+    '''
+    LOF of a set of user points that users are inserted into, updated in and deleted from, one at a time
+    (Pokrajac et al., incremental LOF). Each user has one point. Alongside the neighborhood, k-distance, lrd
+    and lof of every point it keeps the points ranked by distance it was cut from (as far as the (k+1)th
+    closest and its ties, see truncateNeighborhoods) and the reverse neighbors of every point (the points
+    whose ranked points it is among), so a change only touches:
+        the neighborhoods of the reverse neighbors of the point (for an insert, the points it is within the
+        distance to the (k+1)th closest of - found with one ball search per power of two of that distance)
+        the lrd of those, and of the reverse neighbors of points whose k-distance changed
+        the lof of those, and of their reverse neighbors
+    The scores are the ones LOF gives on the current points in insertion order. getTopLOF reads the current
+    top n from a heap of scores, stale entries are dropped as they come up
+    '''
+    def __init__(self, k, dist_metric):
+        self.k = k
+        self.dist_metric = dist_metric
+        self.p = 2 if dist_metric == 'E' else 1
+        self.coords = None #row = id, grown by doubling
+        self.kdist = None #per id arrays, grown with coords
+        self.rankDist = None #distance to the (k+1)th closest point
+        self.lrd = None
+        self.lof = None
+        self.userids = [] #id -> user id, None once deleted
+        self.idOf = {} #user id -> id
+        self.neighbors = [] #id -> neighborhood (ids, closest first), None while there are k+1 or fewer points
+        self.neighborDists = [] #id -> distances to the neighborhood
+        self.ranked = [] #id -> ranked points (ids, closest first) the neighborhood is cut from
+        self.rankedDists = [] #id -> distances to the ranked points
+        self.reverse = [] #id -> ids of the points whose ranked points hold it
+        self.levelOf = [] #id -> level (power of two) of its distance to the (k+1)th closest
+        self.levels = {} #level -> TreeIndex of the points with a (k+1)th distance of that level
+        self.version = [] #id -> number of times its score changed, to spot stale heap entries
+        self.heap = [] #(-lof, id, version)
+        self.index = None #TreeIndex of all present points
+    def __len__(self):
+        return len(self.idOf)
+    def distances(self, i, ids): #distances from point i to points ids, summed in the same order as Point.distance
+        diff = self.coords[ids] - self.coords[i]
+        r = np.zeros(len(diff))
+        for c in range(diff.shape[1]):
+            r += diff[:, c] * diff[:, c] if self.p == 2 else np.abs(diff[:, c])
+        return np.sqrt(r) if self.p == 2 else r
+    def grow(self, dim): #room for one more id
+        if self.coords is None:
+            self.coords = np.zeros((16, dim))
+            self.kdist, self.rankDist, self.lrd, self.lof = np.zeros(16), np.zeros(16), np.zeros(16), np.zeros(16)
+            self.index = TreeIndex(self, self.p)
+        if len(self.userids) == len(self.coords):
+            size = 2 * len(self.coords)
+            self.coords = np.concatenate([self.coords, np.zeros((size - len(self.coords), dim))])
+            self.kdist, self.rankDist, self.lrd, self.lof = [np.concatenate([a, np.zeros(size - len(a))]) for a in (self.kdist, self.rankDist, self.lrd, self.lof)]
+    def findRanked(self, i): #ranked points of point i and the distances to them, as LOF.knnFromCandidates finds them
+        count = self.k + 3
+        while True:
+            ids, beyond = self.index.nearest(self.coords[i], count)
+            ids = np.asarray([j for j in ids if j != i], dtype=np.int64)
+            dists = self.distances(i, ids)
+            order = np.lexsort((ids, dists)) #by distance, ties in insertion order
+            ids, dists = ids[order], dists[order]
+            if len(ids) >= self.k + 1:
+                prevdist = dists[self.k] #distance to the (k+1)th closest point
+                end = self.k + 1
+                while end < len(dists) and math.isclose(dists[end], prevdist):
+                    end += 1
+                if beyond * (1 - 1e-9) > prevdist * (1 + 2e-9): #no point left out can tie with the (k+1)th
+                    return ids[:end], dists[:end]
+            elif beyond == np.inf:
+                raise ValueError("k=" + str(self.k) + " but only " + str(len(ids)) + " other points")
+            count *= 2
+    def setLevel(self, i, level): #move point i to the index of its k-distance level (None - out of all levels)
+        if len(self.levelOf) > i and self.levelOf[i] is not None:
+            old = self.levels[self.levelOf[i]]
+            old.remove(i)
+            if len(old) == 0:
+                del self.levels[self.levelOf[i]]
+        self.levelOf[i] = level
+        if level is not None:
+            if level not in self.levels:
+                self.levels[level] = TreeIndex(self, self.p)
+            self.levels[level].add(i)
+    def setNeighborhood(self, i, ids, dists): #store ranked points and the neighborhood cut from them, returns whether the k-distance changed
+        if self.ranked[i] is not None:
+            for j in self.ranked[i].tolist():
+                self.reverse[j].discard(i)
+        self.ranked[i], self.rankedDists[i] = ids, dists
+        for j in ids.tolist():
+            self.reverse[j].add(i)
+        self.neighbors[i], self.neighborDists[i] = selectNeighborhood(ids, dists, self.k)
+        kdist = self.neighborDists[i][-1]
+        changed = kdist != self.kdist[i] or self.levelOf[i] is None
+        self.kdist[i] = kdist
+        self.rankDist[i] = dists[self.k]
+        level = math.frexp(self.rankDist[i])[1] #rankDist < 2**level
+        if level != self.levelOf[i]:
+            self.setLevel(i, level)
+        return changed
+    def refreshNeighborhoods(self, ids): #search the neighborhoods of points ids again -> (points whose neighborhood changed, whose k-distance changed)
+        changed, kdistChanged = [], []
+        for i in ids:
+            found, dists = self.findRanked(i)
+            if self.ranked[i] is not None and np.array_equal(found, self.ranked[i]) and np.array_equal(dists, self.rankedDists[i]):
+                continue
+            changed.append(i)
+            if self.setNeighborhood(i, found, dists):
+                kdistChanged.append(i)
+        return changed, kdistChanged
+    def refreshScores(self, changed, kdistChanged): #lrd and lof of the points the changed neighborhoods and k-distances reach
+        lrdOf = set(changed)
+        for i in kdistChanged: #reach distances to i changed
+            lrdOf |= self.reverse[i]
+        for i in lrdOf: #sums added in order, as getLOFScores does
+            reach = sum(np.maximum(self.kdist[self.neighbors[i]], self.neighborDists[i]).tolist())
+            self.lrd[i] = len(self.neighbors[i]) / reach if reach > 0 else np.inf
+        lofOf = set(lrdOf)
+        for i in lrdOf:
+            lofOf |= self.reverse[i]
+        for i in lofOf:
+            with np.errstate(divide="ignore", invalid="ignore"):
+                ratio = self.lrd[self.neighbors[i]] / self.lrd[i]
+            if np.isinf(self.lrd[i]):
+                ratio[np.isinf(self.lrd[self.neighbors[i]])] = 1.0 #inf/inf, duplicates are as dense as each other
+            self.lof[i] = sum(ratio.tolist()) / len(self.neighbors[i])
+            self.version[i] += 1
+            heapq.heappush(self.heap, (-self.lof[i], i, self.version[i]))
+        if len(self.heap) > 4 * len(self) + 64: #mostly stale entries
+            self.heap = [(-self.lof[i], i, self.version[i]) for i in self.idOf.values() if self.neighbors[i] is not None]
+            heapq.heapify(self.heap)
+    def refreshAll(self): #neighborhoods and scores of all points from scratch, when there get to be more than k+1 points
+        ids = list(self.idOf.values())
+        self.refreshScores(*self.refreshNeighborhoods(ids))
+    def clearAll(self): #k+1 or fewer points left - no point has a neighborhood
+        for i in self.idOf.values():
+            self.neighbors[i] = self.neighborDists[i] = self.ranked[i] = self.rankedDists[i] = None
+            self.reverse[i] = set()
+            self.setLevel(i, None)
+            self.version[i] += 1
+        self.heap = []
+    def insert(self, userid, values): #add a user's point (or move it, if the user has one), returns its id
+        userid = str(userid)
+        values = np.asarray(values, dtype=np.float64).ravel()
+        moved = set() #points that had the user's old point
+        if userid in self.idOf:
+            i = self.idOf[userid]
+            moved = self.remove(i)
+        else:
+            self.grow(len(values))
+            i = len(self.userids)
+            self.userids.append(None)
+            self.neighbors.append(None)
+            self.neighborDists.append(None)
+            self.ranked.append(None)
+            self.rankedDists.append(None)
+            self.reverse.append(set())
+            self.levelOf.append(None)
+            self.version.append(0)
+        self.coords[i] = values
+        self.userids[i] = userid
+        self.idOf[userid] = i
+        self.index.add(i)
+        if len(self) == self.k + 2:
+            self.refreshAll()
+        elif len(self) > self.k + 2:
+            affected = set() #points the new point is within the distance to the (k+1)th closest of
+            for level, index in self.levels.items():
+                ball = np.asarray(index.ball(self.coords[i], 2.0 ** level), dtype=np.int64)
+                if len(ball) > 0:
+                    near = self.distances(i, ball) <= self.rankDist[ball] * (1 + 2e-9)
+                    affected.update(ball[near].tolist())
+            changed, kdistChanged = self.refreshNeighborhoods([i] + sorted((affected | moved) - set([i])))
+            self.refreshScores(changed, kdistChanged)
+        return i
+    def update(self, userid, values): #move a user's point
+        if str(userid) not in self.idOf:
+            raise KeyError("no point for user " + str(userid))
+        return self.insert(userid, values)
+    def delete(self, userid): #remove a user's point
+        i = self.idOf.get(str(userid))
+        if i is None:
+            raise KeyError("no point for user " + str(userid))
+        affected = self.remove(i)
+        self.userids[i] = None
+        del self.idOf[str(userid)]
+        if len(self) == self.k + 1:
+            self.clearAll()
+        elif len(self) > self.k + 1:
+            self.refreshScores(*self.refreshNeighborhoods(sorted(affected)))
+    #take point i out of the indexes and neighborhoods, returns the points that had it among their ranked points -
+    #their neighborhoods are dropped too (their k-distances kept), to be searched again
+    def remove(self, i):
+        self.index.remove(i)
+        affected = self.reverse[i]
+        for j in affected:
+            for o in self.ranked[j].tolist():
+                if o != i:
+                    self.reverse[o].discard(j)
+            self.neighbors[j] = self.neighborDists[j] = self.ranked[j] = self.rankedDists[j] = None
+        if self.ranked[i] is not None:
+            for j in self.ranked[i].tolist():
+                self.reverse[j].discard(i)
+            self.setLevel(i, None)
+        self.neighbors[i] = self.neighborDists[i] = self.ranked[i] = self.rankedDists[i] = None
+        self.reverse[i] = set()
+        self.version[i] += 1
+        return affected
+    def getScores(self): #(user id, lof score) of every point, in insertion order
+        return [(self.userids[i], float(self.lof[i])) for i in sorted(self.idOf.values()) if self.neighbors[i] is not None]
+    def getTopLOF(self, n=5): #current top n (user id, lof score), as LOF.getAllLOF(n) gives on the current points
+        top, seen = [], []
+        while len(self.heap) > 0 and len(top) < n:
+            entry = heapq.heappop(self.heap)
+            if self.version[entry[1]] == entry[2] and self.userids[entry[1]] is not None:
+                top.append((self.userids[entry[1]], float(-entry[0])))
+                seen.append(entry)
+        for entry in seen: #kept for the next call
+            heapq.heappush(self.heap, entry)
+        return top
 
-data = [['a',0,0,1,4,5],
-        ['b',0,1,1,4,5],
-        ['c',1,1,1,4,5],
-        ['d',3,0,1,4,5]
-    ]
-lof = LOF(data, 2, 'M')
-print("SANITY CHECK - EXAMPLE STOLEN FROM LECTURE SLIDES")
-results = lof.getAllLOF()
-print(results)
-print("ACTUAL DATA FROM CSV")
-data = readData() #read data from csv
-params = [(2, 'M'), (3, 'M'), (2, 'E'), (3, 'E')] #different params to run lof on
-for p in params:
-    #for each param get top 5 outliers and their scores
-    print("FOR k="+str(p[0])+" and distance metric="+p[1]) 
-    lof = LOF(data, p[0], p[1])
+if __name__ == "__main__":
+    data = [['a',0,0,1,4,5],
+            ['b',0,1,1,4,5],
+            ['c',1,1,1,4,5],
+            ['d',3,0,1,4,5]
+        ]
+    lof = LOF(data, 2, 'M')
+    print("SANITY CHECK - EXAMPLE STOLEN FROM LECTURE SLIDES")
     results = lof.getAllLOF()
-    for r in results:
-        print(r[0] + ": " + str(r[1]))
-    print("")
+    print(results)
+    print("ACTUAL DATA FROM CSV")
+    data = readData() #read data from csv
+    params = [(2, 'M'), (3, 'M'), (2, 'E'), (3, 'E')] #different params to run lof on
+    tables = getAllLOFParams(data, params) #top 5 outliers for every param, neighbors searched once per metric
+    for p in params:
+        #for each param show top 5 outliers and their scores
+        print("FOR k="+str(p[0])+" and distance metric="+p[1]) 
+        for r in tables[p]:
+            print(r[0] + ": " + str(r[1]))
+        print("")
             
\ No newline at end of file
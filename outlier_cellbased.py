@@ -1,5 +1,7 @@
 #!usr/bin/python3 
+import itertools
 import math
+import numpy as np
 import pandas as pd
 import matplotlib.pyplot as plt
 
@@ -37,105 +39,97 @@ class Cell:
         return len(self.points)
 
 class Grid:
-    """Class to represent grid of cells """
+    """Class to represent grid of cells - only cells holding points are kept, keyed by their integer cell
+    coordinates (one per attribute, any number of attributes), so memory and time go with the occupied cells
+    and not with the volume of the bounding box """
     def __init__(self, data, r, m):
         self.r = r #parameter d, where d/2 is diagonal length of each cell
         self.m = m #points threshold
-        self.x_min, self.x_max = min(data.T[1]), max(data.T[1]) #x bounds of the grid 
-        self.y_min, self.y_max = min(data.T[2]), max(data.T[2]) #y bounds of the grid 
-        self.grid = []
-        self.assembleGrid() #add appropriate number of cells to grid 
+        self.dim = data.shape[1] - 1 #number of attributes (all columns but user id)
+        self.block_size = r/(2*math.sqrt(self.dim)) #cell width in every attribute
+        self.mins = [min(col) for col in data.T[1:]] #lower bounds of the grid, cell coordinates start at 0 there
+        self.l2_range = math.ceil(2*math.sqrt(self.dim)) #L2 neighbors are up to this many cells away in any attribute
+        self.grid = {} #cell coordinates -> cell
         for d in data: #for each datapoint assign it to a cell in the grid 
             self.addPointToGrid(Point(d))
-    
-    def assembleGrid(self): #function to add appropriate matrix of cells to grid 
-        block_size = self.r/(2*math.sqrt(2)) #get block height and width
-        num_x = math.ceil((self.x_max - self.x_min) / block_size) #number of cols 
-        num_y = math.ceil((self.y_max - self.y_min) / block_size) #num of rows 
-        for i in range(num_y): #for each row 
-            self.grid.append([]) # add empty row 
-            for j in range(num_x): #for each col
-                self.grid[i].append(Cell()) # add empty cell in current row 
+        self.keys = np.array(list(self.grid), dtype=np.int64).reshape(len(self.grid), self.dim) #occupied cells, for neighbor lookups
+
+    def getCell(self, point): #cell coordinates of a point
+        return tuple(math.floor((v - lo) / self.block_size) for v, lo in zip(point.data, self.mins))
 
-    def addPointToGrid(self, point): #function to add point to appropriate cell in grid 
-        block_size = self.r/(2*math.sqrt(2)) #block height/width 
-        block_x = math.floor((point.data[0] - self.x_min) / (block_size)) #column of block - based on x coordinate of point  
-        block_y = math.floor((point.data[1] - self.y_min) / (block_size)) #row of block - based on y coordinate of point 
-        if((block_x > (len(self.grid[0]) - 1) ) or (block_y > (len(self.grid) - 1))): #sanity check 
-            raise ValueError("Invalid point given. Please give a point within range")
-        self.grid[block_y][block_x].addPointToCell(point) #add point to that cell 
+    def addPointToGrid(self, point): #function to add point to appropriate cell in grid, creating the cell if it is the first point in it
+        cell = self.getCell(point)
+        if cell not in self.grid:
+            self.grid[cell] = Cell()
+        self.grid[cell].addPointToCell(point) #add point to that cell 
     
-    def getL2List(self, cell): #function to get L2 neighbors of a cell 
-        lst = []
-        l1lst = self.getL1List(cell) #get L1 neighbors first
-        r_bounds = (max(cell[0]-3, 0), min(cell[0]+4, len(self.grid))) #row range of L2 neighbors 
-        c_bounds = (max(cell[1]-3, 0), min(cell[1]+4, len(self.grid[0]))) #col range of L2 neighbors 
-        for i in range(r_bounds[0], r_bounds[1]): #iterate over rows and columns in L2 and add them to list 
-            for j in range(c_bounds[0], c_bounds[1]):
-                if (i == cell[0] and j==cell[1]) or ((i,j) in l1lst): #if cell is the current cell or L1 neighbor then skip it 
+    #occupied cells more than near and at most far cells away from a cell in some attribute - each key offset is
+    #looked up when there are fewer of them than occupied cells, otherwise every occupied cell is checked
+    def getNeighborList(self, cell, near, far):
+        if (2*far + 1)**self.dim - (2*near + 1)**self.dim < len(self.grid):
+            lst = []
+            for o in itertools.product(range(-far, far+1), repeat=self.dim):
+                if max(abs(d) for d in o) <= near:
                     continue
-                lst.append((i,j)) #else add to list
-        return lst
+                key = tuple(c + d for c, d in zip(cell, o))
+                if key in self.grid:
+                    lst.append(key)
+            return lst
+        steps = np.abs(self.keys - np.array(cell, dtype=np.int64)).max(axis=1)
+        return [tuple(k) for k in self.keys[(steps > near) & (steps <= far)].tolist()]
 
-    def getL1List(self, cell): #function to get l1 neighbors of a cell
-        lst = []
-        for i in range(max(cell[0]-1, 0), min(cell[0]+2, len(self.grid))): #for each row in l1 neighborhood
-            for j in range(max(cell[1]-1, 0), min(cell[1]+2, len(self.grid[0]))): #for each col un l1 neighborhood
-                if i == cell[0] and j==cell[1]: #if cell is current cell then skip 
-                    continue
-                lst.append((i,j)) #else add it to list 
-        return lst
+    def getL2List(self, cell): #function to get the occupied L2 neighbors of a cell 
+        return self.getNeighborList(cell, 1, self.l2_range)
+
+    def getL1List(self, cell): #function to get the occupied l1 neighbors of a cell
+        return self.getNeighborList(cell, 0, 1)
                 
     def colorGrid(self): #function to "color" cells in grid and label points as outliers 
         #first color all densely populated cells red 
         redcells = set() #maintain list of red cells for later 
-        for i, r in enumerate(self.grid):
-            for j, c in enumerate(self.grid[i]):
-                if c.getNumPoints() > self.m:
-                    self.grid[i][j].color = "RED"
-                    redcells.add((i, j))
+        for key, c in self.grid.items():
+            if c.getNumPoints() > self.m:
+                c.color = "RED"
+                redcells.add(key)
         #then color all L1 neighbors of red cells pink, if they are not already labelled red 
         for r in redcells:
             l1cells = self.getL1List(r)
             for t in l1cells:
-                if self.grid[t[0]][t[1]].color != "RED":
-                    self.grid[t[0]][t[1]].color = "PINK"
+                if self.grid[t].color != "RED":
+                    self.grid[t].color = "PINK"
         #for each cell in grid 
-        for i, r in enumerate(self.grid):
-            for j in range(len(self.grid[i])):
-                if(self.grid[i][j].color != "WHITE"): #if cell colored then skip
-                    continue
-                #get count of points in cell and L1 neighborhood
-                count_w2 = 0
-                l1cells = self.getL1List((i,j))
-                for c in l1cells:
-                    count_w2 += self.grid[c[0]][c[1]].getNumPoints()
-                if(count_w2 > self.m): #if it is greater than the m threshold then label it pink 
-                    self.grid[i][j].color = "PINK"
-                else:
-                    #get count of points in cell L1 neighborhood and L2 neighborhood
-                    count_w3 = count_w2 
-                    l2cells = self.getL2List((i,j))
-                    for c in l2cells:
-                        count_w3 += self.grid[c[0]][c[1]].getNumPoints()
-                    if count_w3 <= self.m: #if count less than threshold then mark all points in current cell as outliers 
-                        for pi, p in enumerate(self.grid[i][j].points):
-                            self.grid[i][j].points[pi].markAsOutlier()
-                    else: #otherwise for each point in cell compare distance with points in L2 neighbors of cell
-                        for pi, p in enumerate(self.grid[i][j].points):
-                            count_p = 0
-                            for c in l2cells:
-                                for pc in (self.grid[c[0]][c[1]].points):
-                                    if p.distance(pc) <= self.r: #if distance is less than threshold then add to count of point 
-                                        count_p += 1
-                            if count_p <= self.m: #if count is less than threshold then mark that point as outlier
-                                self.grid[i][j].points[pi].markAsOutlier()
+        for key, cell in self.grid.items():
+            if(cell.color != "WHITE"): #if cell colored then skip
+                continue
+            #get count of points in cell and L1 neighborhood
+            count_w2 = 0
+            l1cells = self.getL1List(key)
+            for c in l1cells:
+                count_w2 += self.grid[c].getNumPoints()
+            if(count_w2 > self.m): #if it is greater than the m threshold then label it pink 
+                cell.color = "PINK"
+            else:
+                #get count of points in cell L1 neighborhood and L2 neighborhood
+                count_w3 = count_w2 
+                l2cells = self.getL2List(key)
+                for c in l2cells:
+                    count_w3 += self.grid[c].getNumPoints()
+                if count_w3 <= self.m: #if count less than threshold then mark all points in current cell as outliers 
+                    for p in cell.points:
+                        p.markAsOutlier()
+                else: #otherwise for each point in cell compare distance with points in L2 neighbors of cell
+                    l2points = np.array([pc.data for c in l2cells for pc in self.grid[c].points], dtype=np.float64)
+                    for p in cell.points:
+                        dists = np.sqrt(((l2points - np.asarray(p.data, dtype=np.float64)) ** 2).sum(axis=1)) #same sums as Point.distance
+                        count_p = np.count_nonzero(dists <= self.r) #count of points within distance threshold
+                        if count_p <= self.m: #if count is less than threshold then mark that point as outlier
+                            p.markAsOutlier()
 
 
 attr_combos = [["pause_video", "play_video"], ["play_video", "seek_video"]] #different attribute combos to be considerd
 for attrs in attr_combos: #for each attr
     data = readData(attrs) #read data on current attrs 
-    attr_string = attrs[0] + " and " + attrs[1] 
+    attr_string = " and ".join(attrs) 
     dvals = [10,15,20,25] #different d values to be tested
     mvals = [5,10] # different m values to be tested
     #for each combo of d aand m
@@ -145,14 +139,13 @@ for attrs in attr_combos: #for each attr
             grid.colorGrid() #"color" each cell in grid and mark points as outliers
             outliers = [] #maintain list of outliers
             #for each cell in grid
-            for i in range(len(grid.grid)): 
-                for c in grid.grid[i]:
-                    #for each point in cell
-                    for p in c.points:
-                        #plot point on graph
-                        plt.scatter(p.data[0], p.data[1], color=("black" if p.outlier == True else "red")) #different colors for outliers
-                        if p.outlier == True:
-                            outliers.append(p.user_id)
+            for c in grid.grid.values(): 
+                #for each point in cell
+                for p in c.points:
+                    #plot point on graph (first two attributes)
+                    plt.scatter(p.data[0], p.data[1], color=("black" if p.outlier == True else "red")) #different colors for outliers
+                    if p.outlier == True:
+                        outliers.append(p.user_id)
             title = attr_string + " D="+str(d) + " M="+str(m) + " : We have " + str(len(outliers)) + "outliers "
             plt.title(title) #plot points
             plt.savefig(OUTDIR + title+".png", bbox_inches="tight")
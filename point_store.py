@@ -0,0 +1,50 @@
+import itertools
+import os
+import numpy as np
+import scipy.io as scio
+
+
+class PointSet:
+    '''
+    Columnar point storage shared by the clustering scripts
+    coords - (n, d) float array, one row per point (any number of dimensions)
+    labels - int array with one label per point, shared by whichever model is run on the points
+    '''
+    def __init__(self, coords, undefined = -2, dtype = np.float64): #undefined is the label points start with and are reset to
+        coords = np.asarray(coords, dtype=dtype)
+        self.coords = np.ascontiguousarray(coords.reshape(len(coords), -1))
+        self.undefined = undefined
+        self.labels = np.full(len(self.coords), undefined, dtype=np.int64)
+    @classmethod
+    def fromMat(cls, filename, key = "Points", columns = None, undefined = -2): #load points from a matlab file, optionally only some columns
+        data = scio.loadmat(filename)[key]
+        if columns is not None:
+            data = data[:, columns]
+        return cls(data, undefined)
+    def __len__(self):
+        return len(self.coords)
+    def getDim(self): #number of dimensions of each point
+        return self.coords.shape[1]
+    def resetLabels(self): #reset all labels to undefined
+        self.labels[:] = self.undefined
+    def distancesFrom(self, i, idx = None): #euclidian distances between point i and the points idx (all points if None)
+        other = self.coords if idx is None else self.coords[idx]
+        return np.sqrt(((other - self.coords[i]) ** 2).sum(axis=1))
+
+#read the rows of a point file a chunk of about chunkRows rows at a time, optionally only some columns
+#.npy files are memory mapped and CSV files read line by line, so neither has to fit in memory - a .mat
+#file (key is its matrix) is loaded whole by scipy and only handed out in chunks
+def readPointChunks(filename, chunkRows, columns = None, key = "Points", delimiter = ","):
+    ext = os.path.splitext(filename)[1].lower()
+    if ext == ".csv" or ext == ".txt":
+        with open(filename, "r") as fl:
+            while True:
+                rows = [line for line in itertools.islice(fl, chunkRows) if line.strip() != '']
+                if len(rows) == 0:
+                    return
+                chunk = np.loadtxt(rows, delimiter=delimiter, ndmin=2)
+                yield chunk if columns is None else chunk[:, columns]
+    data = np.load(filename, mmap_mode="r") if ext == ".npy" else scio.loadmat(filename)[key]
+    for start in range(0, len(data), chunkRows):
+        chunk = np.asarray(data[start:start+chunkRows], dtype=np.float64).reshape(-1, data.shape[1] if data.ndim > 1 else 1)
+        yield chunk if columns is None else chunk[:, columns]
@@ -0,0 +1,44 @@
+#!usr/bin/python3
+import numpy as np
+import cluster_dbscan
+from point_store import PointSet
+
+def randomPoints(rng, n): #half on a half unit lattice (duplicates, distances exactly epsilon), half anywhere in between
+    lattice = rng.integers(0, 12, (n // 2, 2)) * 0.5
+    return np.concatenate((lattice, rng.uniform(0, 6, (n - n // 2, 2))))
+
+def scanLabels(coords, epsilon, minpoints): #labels and number of clusters of a plain DBScan run
+    points = PointSet(coords)
+    model = cluster_dbscan.DBScan(points, epsilon, minpoints)
+    model.runScan()
+    return points.labels.tolist(), model.clusters
+
+def test_sweep_matches_scan():
+    rng = np.random.default_rng(0)
+    for n in (1, 60, 300):
+        coords = randomPoints(rng, n)
+        epsilons, minpointsList = [0.25, 0.5, 0.7, 1.0], [1, 2, 3, 5, 8]
+        sweep = cluster_dbscan.DBScanSweep(PointSet(coords), epsilons, minpointsList)
+        for eps in epsilons:
+            for minpts in minpointsList:
+                labels, clusters = sweep.getLabels(eps, minpts)
+                assert (labels.tolist(), clusters) == scanLabels(coords, eps, minpts)
+
+def test_incremental_matches_scan(): #random inserts and deletes, labels always as runScan on the points present
+    rng = np.random.default_rng(1)
+    for eps, minpts in ((0.5, 3), (0.7, 4), (1.0, 1)):
+        model = cluster_dbscan.IncrementalDBScan(eps, minpts)
+        coords = {} #id -> coordinates of the present points
+        for step in range(40):
+            if len(coords) == 0 or rng.random() < 0.6:
+                new = randomPoints(rng, int(rng.integers(1, 20)))
+                coords.update(zip(model.insert(new), new))
+            else:
+                gone = rng.choice(sorted(coords), int(rng.integers(1, min(len(coords), 15) + 1)), replace=False).tolist()
+                model.delete(gone)
+                for i in gone:
+                    del coords[i]
+            ids, labels = model.getLabels()
+            assert ids.tolist() == sorted(coords)
+            if len(ids) > 0:
+                assert (labels.tolist(), model.clusters) == scanLabels(np.array([coords[i] for i in ids]), eps, minpts)
@@ -0,0 +1,25 @@
+#!usr/bin/python3
+import numpy as np
+import freqitems_apriori
+import freqitems_relim
+from transaction_store import TransactionStore, VerticalIndex
+from test_freqitems_relim import randomTransactions, bruteForce
+
+def test_son_matches_serial(tmp_path, monkeypatch): #SON, serial apriori and FP-growth all find the same itemsets
+    rng = np.random.default_rng(1)
+    for trial in range(3):
+        transactions = randomTransactions(rng, 400, 12)
+        filename = str(tmp_path / ("transactions" + str(trial) + ".txt"))
+        with open(filename, "w") as fl:
+            fl.write("\n".join(" ".join(t) for t in transactions) + "\n")
+        store = TransactionStore(filename) #workers memory map its cache
+        for minsup in (3, 40):
+            monkeypatch.setattr(freqitems_apriori, "MINSUP", minsup)
+            monkeypatch.setattr(freqitems_relim, "MINSUP", minsup)
+            expected = bruteForce(transactions, minsup)
+            named = lambda results: {frozenset(store.getItemName(i) for i in r[0]): r[1] for r in results}
+            index = VerticalIndex(store.offsets, store.items, store.getFrequentItemIds(minsup))
+            assert named(freqitems_apriori.getPrunedItemsets(index)) == expected
+            for workers in (1, 3):
+                assert named(freqitems_apriori.getPrunedItemsetsParallel(store, workers)) == expected
+            assert freqitems_relim.getFrequentItems(store) == expected
@@ -0,0 +1,27 @@
+#!usr/bin/python3
+import os
+import numpy as np
+import freqitems_incremental
+from test_freqitems_relim import randomTransactions, bruteForce
+
+def test_update_matches_full_run(tmp_path): #FUP over appended batches finds what mining everything again finds
+    rng = np.random.default_rng(2)
+    for ratio in (0.02, 0.1):
+        filename = str(tmp_path / ("transactions" + str(ratio) + ".txt"))
+        stateFile = filename + ".json"
+        transactions = []
+        open(filename, "w").close()
+        for batch in range(6):
+            #later batches rename the items, so itemsets that were rare become frequent and the other way round
+            rename = rng.permutation(15)
+            new = [sorted(set('i' + str(rename[int(i[1:])]) for i in t)) for t in randomTransactions(rng, int(rng.integers(0, 150)), 15)]
+            transactions.extend(new)
+            with open(filename, "a") as fl:
+                fl.write("".join(" ".join(t) + "\n" for t in new))
+            state, stats = freqitems_incremental.runIncremental(filename, stateFile, ratio)
+            full, fullStats = freqitems_incremental.runIncremental(filename, filename + ".full.json", ratio)
+            os.remove(filename + ".full.json")
+            expected = bruteForce(transactions, freqitems_incremental.getMinCount(ratio, len(transactions)))
+            assert state["numTransactions"] == full["numTransactions"] == len(transactions)
+            assert state["itemsets"] == full["itemsets"]
+            assert {frozenset(c): cnt for c, cnt in state["itemsets"].items()} == expected
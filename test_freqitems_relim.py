@@ -0,0 +1,28 @@
+#!usr/bin/python3
+import itertools
+import numpy as np
+import freqitems_relim
+from transaction_store import TransactionStore
+
+def randomTransactions(rng, n, numItems): #transactions of a few random items, low item numbers are the most common
+    return [sorted(set('i' + str(i) for i in rng.geometric(0.3, rng.integers(0, 7)) - 1 if i < numItems)) for _ in range(n)]
+
+def bruteForce(transactions, minsup): #support count of every itemset contained in some transaction, kept if >= minsup
+    counts = {}
+    for t in transactions:
+        for k in range(1, len(t) + 1):
+            for c in itertools.combinations(t, k):
+                counts[frozenset(c)] = counts.get(frozenset(c), 0) + 1
+    return {c: cnt for c, cnt in counts.items() if cnt >= minsup}
+
+def test_matches_brute_force(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    for trial in range(5):
+        transactions = randomTransactions(rng, 300, 12)
+        filename = str(tmp_path / ("transactions" + str(trial) + ".txt"))
+        with open(filename, "w") as fl: #every item written twice, only the first one counts
+            fl.write("\n".join(" ".join(t + t[::-1]) for t in transactions) + "\n")
+        store = TransactionStore(filename, useCache=False)
+        for minsup in (1, 4, 30):
+            monkeypatch.setattr(freqitems_relim, "MINSUP", minsup)
+            assert freqitems_relim.getFrequentItems(store) == bruteForce(transactions, minsup)
@@ -0,0 +1,50 @@
+#!usr/bin/python3
+import math
+import numpy as np
+import outlier_LOF
+
+#three points on top of each other at (0,0) and at (5,5), each with one point next to them, and one far away
+DUPLICATES = [['a',0,0],['b',0,0],['c',0,0],['d',1,0],['e',5,5],['f',5,5],['g',5,5],['h',6,5],['i',2,9]]
+
+def test_duplicates_have_lof_one(): #duplicates are exactly as dense as each other, no nan
+    lof = outlier_LOF.LOF(DUPLICATES, 2, 'E').computeLOF()
+    assert not np.isnan(lof).any()
+    assert lof[[0, 1, 2, 4, 5, 6]].tolist() == [1.0] * 6
+    assert np.isinf(lof[[3, 7]]).all() #neighbors are duplicates, the point itself is not
+
+def test_ranking_with_duplicates():
+    for metric in ('E', 'M'):
+        top = outlier_LOF.LOF(DUPLICATES, 2, metric).getAllLOF(len(DUPLICATES))
+        scores = [s for _, s in top]
+        assert not any(math.isnan(s) for s in scores)
+        assert scores == sorted(scores, reverse=True)
+        assert sorted(u for u, _ in top[:2]) == ['d', 'h']
+
+def test_top_outliers_nan_last():
+    top = outlier_LOF.getTopOutliers(['a', 'b', 'c', 'd'], np.array([1.0, np.nan, 3.0, 2.0]), 4)
+    assert [u for u, _ in top] == ['c', 'd', 'a', 'b']
+
+def test_top_lof_with_duplicates(): #points with an infinite lof are not pruned
+    for metric in ('E', 'M'):
+        for n in (1, 3, 5):
+            assert outlier_LOF.LOF(DUPLICATES, 2, metric).getTopLOF(n) == outlier_LOF.LOF(DUPLICATES, 2, metric).getAllLOF(n)[:n]
+
+def test_top_lof_matches_all(): #integer data, full of ties and duplicate clusters
+    rng = np.random.default_rng(0)
+    data = rng.poisson(3, (400, 3))
+    rows = [['user' + str(u)] + r for u, r in zip(rng.integers(0, 300, len(data)), data.tolist())]
+    for metric in ('E', 'M'):
+        for k in (2, 3):
+            for n in (1, 8):
+                assert outlier_LOF.LOF(rows, k, metric).getTopLOF(n, size=4) == outlier_LOF.LOF(rows, k, metric).getAllLOF(n)[:n]
+
+def test_incremental_with_duplicates(): #same scores as LOF on the current points, duplicates included
+    inc = outlier_LOF.IncrementalLOF(2, 'E')
+    for row in DUPLICATES:
+        inc.insert(row[0], row[1:])
+    assert inc.getTopLOF(len(DUPLICATES)) == outlier_LOF.LOF(DUPLICATES, 2, 'E').getAllLOF(len(DUPLICATES))
+    inc.update('i', [5, 5])
+    inc.delete('d')
+    rows = [r if r[0] != 'i' else ['i', 5, 5] for r in DUPLICATES if r[0] != 'd']
+    assert inc.getScores() == [(u, float(s)) for u, s in zip([r[0] for r in rows], outlier_LOF.LOF(rows, 2, 'E').computeLOF())]
+    assert inc.getTopLOF(3) == outlier_LOF.LOF(rows, 2, 'E').getAllLOF(3)
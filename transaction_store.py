@@ -0,0 +1,206 @@
+from array import array
+import json
+import os
+import numpy as np
+
+
+class TransactionStore: #Shared helper class to retrieve transactions from database and maintain single item count
+    """Transactions are read once from a text file (one transaction per line, items separated by spaces)
+    and kept in CSR form - transaction t holds items[offsets[t]:offsets[t+1]].
+    Item strings are mapped to dense integer ids (in order of first appearance), each transaction keeps its
+    item ids sorted and without duplicates. The arrays are written to a binary cache next to the file and
+    memory mapped on later runs, so the text is only parsed again when the file changes."""
+    FILENAME = "freq_items_dataset.txt" #file with transactions
+    def __init__(self, filename = None, useCache = True):
+        self.filename = TransactionStore.FILENAME if filename is None else filename
+        self.cachedir = self.filename + ".cache" #directory holding the binary cache
+        if not (useCache and self.loadCache()):
+            self.parse()
+            if useCache:
+                self.writeCache()
+        self.itemIds = {name: i for i, name in enumerate(self.names)} #item string -> item id
+
+    def parse(self): #stream the text file into CSR arrays
+        ids = {} #item string -> item id
+        self.names = [] #item id -> item string
+        items = array('i') #all transactions' item ids back to back
+        offsets = array('q', [0]) #start of each transaction in items (plus the end of the last one)
+        with open(self.filename, "r") as fl:
+            for row in fl: #for each transaction
+                items.extend(encodeTransaction(row, ids, self.names))
+                offsets.append(len(items))
+        self.items = np.frombuffer(items, dtype=np.int32).copy() if len(items) > 0 else np.zeros(0, dtype=np.int32)
+        self.offsets = np.frombuffer(offsets, dtype=np.int64).copy()
+        self.itemCounts = np.bincount(self.items, minlength=len(self.names)).astype(np.int64) #support count of each item
+
+    def sourceStamp(self): #size and modification time of the text file, used to invalidate the cache
+        st = os.stat(self.filename)
+        return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+    def loadCache(self): #memory map the cached arrays, returns False if there is no valid cache
+        try:
+            with open(os.path.join(self.cachedir, "meta.json"), "r") as fl:
+                meta = json.load(fl)
+            if meta != self.sourceStamp():
+                return False
+            self.offsets = np.load(os.path.join(self.cachedir, "offsets.npy"), mmap_mode="r")
+            self.items = np.load(os.path.join(self.cachedir, "items.npy"), mmap_mode="r")
+            self.itemCounts = np.load(os.path.join(self.cachedir, "counts.npy"), mmap_mode="r")
+            with open(os.path.join(self.cachedir, "names.txt"), "r") as fl:
+                self.names = fl.read().split("\n") if len(self.itemCounts) > 0 else []
+            return len(self.names) == len(self.itemCounts)
+        except (OSError, ValueError):
+            return False
+
+    def writeCache(self): #write the arrays as .npy files, meta.json is written last and marks the cache as complete
+        if not os.path.isdir(self.cachedir):
+            os.makedirs(self.cachedir)
+        metafile = os.path.join(self.cachedir, "meta.json")
+        if os.path.exists(metafile):
+            os.remove(metafile)
+        np.save(os.path.join(self.cachedir, "offsets.npy"), self.offsets)
+        np.save(os.path.join(self.cachedir, "items.npy"), self.items)
+        np.save(os.path.join(self.cachedir, "counts.npy"), self.itemCounts)
+        with open(os.path.join(self.cachedir, "names.txt"), "w") as fl:
+            fl.write("\n".join(self.names))
+        with open(metafile, "w") as fl:
+            json.dump(self.sourceStamp(), fl)
+
+    def getNumTransactions(self): #number of transactions in db
+        return len(self.offsets) - 1
+    def getTransaction(self, t): #item ids of transaction t
+        return self.items[self.offsets[t]:self.offsets[t+1]]
+    def getAllItems(self): #return all unique items in transactions
+        return list(self.names)
+    def getItemId(self, name): #integer id of an item string
+        return self.itemIds[name]
+    def getItemName(self, i): #item string of an integer id
+        return self.names[i]
+    def getSingleItemCount(self, name): #get support count for single item
+        return int(self.itemCounts[self.itemIds[name]]) if name in self.itemIds else 0
+    def getFrequentItemIds(self, minsup): #ids of all items with support count >= minsup
+        return np.nonzero(np.asarray(self.itemCounts) >= minsup)[0].tolist()
+
+
+def encodeTransaction(row, ids, names = None): #sorted, de-duplicated item ids of one line of the transactions file
+    #items not in ids yet get the next id (and are appended to names), or are skipped when names is None
+    tids = []
+    for r in set(r for r in row.rstrip("\n").split(" ") if r != ''): #split to get each item in given transaction
+        i = ids.get(r)
+        if i is None:
+            if names is None: #fixed dictionary, item is not of interest
+                continue
+            i = ids[r] = len(names) #first time this item is seen, give it the next id
+            names.append(r)
+        tids.append(i)
+    tids.sort()
+    return tids
+
+#read whole transactions from bytes [start, end) of a transactions file in chunks of about chunkBytes of text
+#yields (offsets, items, nbytes) CSR arrays for each chunk, items are encoded with encodeTransaction(row, ids, names)
+def readTransactionChunks(filename, chunkBytes, ids, names = None, start = 0, end = None):
+    with open(filename, "rb") as fl:
+        fl.seek(start)
+        remaining = (os.path.getsize(filename) if end is None else end) - start
+        carry = b"" #partial last line of the previous read
+        while remaining > 0 or len(carry) > 0:
+            data = fl.read(min(chunkBytes, remaining)) if remaining > 0 else b""
+            remaining -= len(data)
+            data = carry + data
+            cut = data.rfind(b"\n") + 1 if remaining > 0 else len(data) #only complete lines, unless this is the end
+            if cut == 0: #a single line longer than chunkBytes - keep reading until it ends
+                carry = data
+                continue
+            data, carry = data[:cut], data[cut:]
+            rows = data.decode("utf-8").split("\n")
+            if data.endswith(b"\n"): #nothing after the last newline
+                rows.pop()
+            items = array('i')
+            offsets = array('q', [0])
+            for row in rows:
+                items.extend(encodeTransaction(row, ids, names))
+                offsets.append(len(items))
+            items = np.frombuffer(items, dtype=np.int32) if len(items) > 0 else np.zeros(0, dtype=np.int32)
+            yield np.frombuffer(offsets, dtype=np.int64), items, len(data)
+
+
+#masks for the SWAR popcount of 64 bit words (np.bitwise_count is used instead where numpy has it)
+M1, M2, M4, H01 = [np.uint64(m) for m in (0x5555555555555555, 0x3333333333333333, 0x0f0f0f0f0f0f0f0f, 0x0101010101010101)]
+BATCH_SIZE = 4096 #max number of candidate bitmaps materialized at once while counting a level
+
+class VerticalIndex: #vertical view of the transactions - each item maps to a bitmap of the transactions containing it
+    def __init__(self, offsets, items, itemIds = None): #build bitmaps once from CSR arrays, optionally only for the given item ids
+        offsets = np.asarray(offsets) #may be a slice of a larger store, so it is rebased to start at 0
+        items = np.asarray(items[offsets[0]:offsets[-1]])
+        self.numTransactions = len(offsets) - 1
+        tids = np.repeat(np.arange(self.numTransactions, dtype=np.int64), np.diff(offsets)) #transaction of every item occurrence
+        if itemIds is not None:
+            keep = np.isin(items, np.asarray(list(itemIds), dtype=items.dtype))
+            items, tids = items[keep], tids[keep]
+        ids, rows = np.unique(items, return_inverse=True)
+        self.itemRow = {i: row for row, i in enumerate(ids.tolist())} #item id -> row of its bitmap in self.bitmaps
+        #8 transactions per byte, rows padded to whole 64 bit words so they can be popcounted a word at a time
+        self.bitmaps = np.zeros((len(ids), (self.numTransactions + 63) // 64 * 8), dtype=np.uint8)
+        #OR the bits of each (item, byte) pair together with one reduceat over the pairs in sorted order
+        key = rows.reshape(-1).astype(np.int64) * self.bitmaps.shape[1] + (tids >> 3) #flat byte of every occurrence
+        order = np.argsort(key, kind="stable")
+        key, bits = key[order], (128 >> (tids[order] & 7)).astype(np.uint8)
+        if len(key) > 0:
+            starts = np.flatnonzero(np.concatenate(([True], key[1:] != key[:-1])))
+            self.bitmaps.reshape(-1)[key[starts]] = np.bitwise_or.reduceat(bits, starts)
+
+    def getItems(self): #return all item ids that have a bitmap
+        return list(self.itemRow.keys())
+
+    def popcount(self, bitmaps): #number of transactions set in each bitmap (last axis holds the packed bytes)
+        words = np.ascontiguousarray(bitmaps).view(np.uint64)
+        if hasattr(np, "bitwise_count"):
+            return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+        words = words - ((words >> np.uint64(1)) & M1)
+        words = (words & M2) + ((words >> np.uint64(2)) & M2)
+        words = (words + (words >> np.uint64(4))) & M4
+        return ((words * H01) >> np.uint64(56)).sum(axis=-1, dtype=np.int64)
+
+    def getAllBitmap(self): #bitmap with every indexed transaction set
+        bm = np.zeros(self.bitmaps.shape[1], dtype=np.uint8)
+        full = np.packbits(np.ones(self.numTransactions, dtype=bool))
+        bm[:len(full)] = full
+        return bm
+
+    def getBitmap(self, itemset): #AND together the bitmaps of all items in itemset
+        bm = self.bitmaps[self.itemRow[itemset[0]]]
+        for i in itemset[1:]:
+            bm = bm & self.bitmaps[self.itemRow[i]]
+        return bm
+
+    def getSupportCount(self, itemset): #get support count for a single itemset
+        if any(i not in self.itemRow for i in itemset): #item never seen in the indexed transactions
+            return 0
+        return int(self.popcount(self.getBitmap(tuple(itemset))))
+
+    #count a whole level of candidates (sorted tuples of the same length k >= 2)
+    #prefixBitmaps holds cached bitmaps of (k-1)-prefixes, missing prefixes are computed and cached
+    #returns a list of support counts aligned with candidates and a dict of the candidates' own bitmaps,
+    #only for the candidates where keep(candidate, count) is true when keep is given
+    def countLevel(self, candidates, prefixBitmaps, keep = None):
+        groups = {} #prefix -> positions of candidates extending it
+        for ci, c in enumerate(candidates):
+            groups.setdefault(c[:-1], []).append(ci)
+        counts = [0] * len(candidates)
+        bitmaps = {}
+        for prefix, members in groups.items():
+            if any(i not in self.itemRow for i in prefix):
+                continue
+            if prefix not in prefixBitmaps:
+                prefixBitmaps[prefix] = self.getBitmap(prefix)
+            prefixBm = prefixBitmaps[prefix]
+            members = [ci for ci in members if candidates[ci][-1] in self.itemRow]
+            for b in range(0, len(members), BATCH_SIZE): #AND the shared prefix with the last item of a batch of candidates
+                batch = members[b:b+BATCH_SIZE]
+                rows = [self.itemRow[candidates[ci][-1]] for ci in batch]
+                candBm = self.bitmaps[rows] & prefixBm
+                for ci, bm, cnt in zip(batch, candBm, self.popcount(candBm)):
+                    counts[ci] = int(cnt)
+                    if keep is None or keep(candidates[ci], counts[ci]):
+                        bitmaps[candidates[ci]] = bm.copy() #copy, so the rest of the batch can be freed
+        return counts, bitmaps